@@ -9,27 +9,50 @@ This orchestrates the multi-step analysis:
 5. Find LinkedIn contacts
 6. Generate outreach emails
 7. Generate resume suggestions
+
+Steps 3-7 only depend on the extracted job info, so they run as parallel
+branches (emails after contacts) and join again before completion. With
+ANALYSIS_LLM_MODE=combined, steps 3, 4 and 7 come from a single LLM call.
 """
 
-from langgraph.graph import StateGraph, END
-from typing import TypedDict, Optional, Any
+from typing import TypedDict, Optional, Annotated
 import asyncio
+import os
 
 from app.services.exa_client import scrape_job_posting, search_linkedin_alumni
 from app.services.openai_client import (
     extract_job_info,
-    calculate_ats_score,
     analyze_gaps,
     generate_resume_suggestions,
-    generate_outreach_email
+    generate_outreach_emails,
+    analyze_fit,
+    LLM_STREAMING,
+    ANALYSIS_LLM_MODE
 )
-from app.services.database import add_message, update_thread
+from app.services.ats_scorer import score_ats, score_resume
+from app.services.resume import prepare_resume
+from app.services.prompts import build_resume_text
+from app.services.database import aadd_message, aupdate_thread, fetch_thread, MessageWriter, StreamingMessage
+from app.services import coalescing
+from app.services.metrics import instrument_node
+from app.services.resilience import analysis_deadline
+from app.services.checkpoints import get_checkpointer, checkpoint_config
+
+# "llm" asks the model for gaps; "semantic" reports requirements that no
+# resume bullet is close to, without an LLM call (see semantic.py)
+GAP_ANALYSIS_MODE = os.getenv("GAP_ANALYSIS_MODE", "llm")
+
+
+def keep_first_error(current: Optional[str], update: Optional[str]) -> Optional[str]:
+    """Merge `error` updates from parallel branches, keeping the first one reported."""
+    return current or update
 
 
 class AnalysisState(TypedDict):
     thread_id: int
     job_url: str
     user_profile: dict
+    resume: Optional[dict]
     job_raw_text: Optional[str]
     job_info: Optional[dict]
     ats_result: Optional[dict]
@@ -37,81 +60,91 @@ class AnalysisState(TypedDict):
     contacts: Optional[list]
     emails: Optional[list]
     suggestions: Optional[list]
-    error: Optional[str]
+    error: Annotated[Optional[str], keep_first_error]
 
 
-def scrape_job_node(state: AnalysisState) -> AnalysisState:
+# Nodes return only the keys they change so that branches running in the
+# same step can be merged without clobbering each other's results.
+
+async def scrape_job_node(state: AnalysisState) -> dict:
     """Scrape job posting using Exa."""
     try:
-        result = asyncio.run(scrape_job_posting(state["job_url"]))
-        state["job_raw_text"] = result.get("text", "")
+        result = await scrape_job_posting(state["job_url"])
+        job_raw_text = result.get("text", "")
+        if not job_raw_text:
+            return {"error": "Couldn't read the job posting at that URL."}
         
-        add_message(
+        await aadd_message(
             state["thread_id"],
             "assistant",
             f"Found the job posting! Extracting details...",
-            "text"
+            "text",
+            step="scrape_job"
         )
         
-        return state
+        return {"job_raw_text": job_raw_text}
     except Exception as e:
-        state["error"] = str(e)
-        return state
+        return {"error": str(e)}
+
 
+async def prepare_resume_node(state: AnalysisState) -> dict:
+    """Preprocess the resume once so every later stage can reuse it."""
+    try:
+        resume = await prepare_resume(state.get("user_profile", {}).get("resumeText") or "")
+        return {"resume": resume}
+    except Exception as e:
+        return {"error": str(e)}
 
-def extract_info_node(state: AnalysisState) -> AnalysisState:
+
+async def extract_info_node(state: AnalysisState) -> Optional[dict]:
     """Extract structured info from job posting."""
     if state.get("error"):
-        return state
+        # No update; LangGraph rejects an empty dict from a node
+        return None
     
     try:
-        job_info = asyncio.run(extract_job_info(state.get("job_raw_text", "")))
-        state["job_info"] = job_info
-        
-        # Update thread with company/role
-        update_thread(
-            state["thread_id"],
-            company=job_info.get("company"),
-            role=job_info.get("role")
-        )
+        job_info = await extract_job_info(state.get("job_raw_text", ""))
         
-        # Add job info message
-        add_message(
-            state["thread_id"],
-            "assistant",
-            f"Here's what I found about this position:",
-            "job_info",
-            {
-                "company": job_info.get("company"),
-                "role": job_info.get("role"),
-                "location": job_info.get("location"),
-                "requirements": job_info.get("requirements", [])[:5]
-            }
-        )
+        async with MessageWriter(state["thread_id"], step="extract_info") as writer:
+            # Update thread with company/role
+            writer.update_thread(
+                company=job_info.get("company"),
+                role=job_info.get("role")
+            )
+            
+            # Add job info message
+            writer.add_message(
+                "assistant",
+                f"Here's what I found about this position:",
+                "job_info",
+                {
+                    "company": job_info.get("company"),
+                    "role": job_info.get("role"),
+                    "location": job_info.get("location"),
+                    "requirements": job_info.get("requirements", [])[:5]
+                }
+            )
         
-        return state
+        return {"job_info": job_info}
     except Exception as e:
-        state["error"] = str(e)
-        return state
+        return {"error": str(e)}
 
 
-def ats_score_node(state: AnalysisState) -> AnalysisState:
+async def ats_score_node(state: AnalysisState) -> Optional[dict]:
     """Calculate ATS match score."""
     if state.get("error"):
-        return state
+        return None
     
     try:
         job_info = state.get("job_info", {})
-        resume_text = state.get("user_profile", {}).get("resumeText", "")
         
-        result = asyncio.run(calculate_ats_score(
-            resume_text,
+        result = await score_ats(
+            state.get("resume"),
             job_info.get("keywords", []),
             job_info.get("requirements", [])
-        ))
-        state["ats_result"] = result
+        )
         
-        add_message(
+        await aadd_message(
             state["thread_id"],
             "assistant",
             result.get("analysis", "Analysis complete."),
@@ -120,49 +153,57 @@ def ats_score_node(state: AnalysisState) -> AnalysisState:
                 "score": result.get("score", 0),
                 "matchedKeywords": result.get("matchedKeywords", []),
                 "missingKeywords": result.get("missingKeywords", [])
-            }
+            },
+            step="ats_score"
         )
         
-        return state
+        return {"ats_result": result}
     except Exception as e:
-        state["error"] = str(e)
-        return state
+        return {"error": str(e)}
 
 
-def gap_analysis_node(state: AnalysisState) -> AnalysisState:
+async def gap_analysis_node(state: AnalysisState) -> Optional[dict]:
     """Analyze gaps between candidate and requirements."""
     if state.get("error"):
-        return state
+        return None
     
     try:
         job_info = state.get("job_info", {})
-        resume_text = state.get("user_profile", {}).get("resumeText", "")
         
-        gaps = asyncio.run(analyze_gaps(
-            resume_text,
-            job_info.get("requirements", []),
-            state.get("user_profile", {})
-        ))
-        state["gaps"] = gaps
+        gaps = None
+        if GAP_ANALYSIS_MODE == "semantic":
+            # Loaded on demand so the default mode never imports NumPy
+            from app.services.semantic import semantic_gaps
+            try:
+                gaps = await semantic_gaps(state.get("resume"), job_info.get("requirements", []))
+            except Exception as e:
+                print(f"Semantic gap analysis failed, asking the model: {e}")
+        
+        if gaps is None:
+            gaps = await analyze_gaps(
+                build_resume_text(state.get("resume"), job_info.get("requirements", [])),
+                job_info.get("requirements", []),
+                state.get("user_profile", {})
+            )
         
-        add_message(
+        await aadd_message(
             state["thread_id"],
             "assistant",
             "Here are some areas to address:",
             "gaps",
-            {"gaps": gaps}
+            {"gaps": gaps},
+            step="gap_analysis"
         )
         
-        return state
+        return {"gaps": gaps}
     except Exception as e:
-        state["error"] = str(e)
-        return state
+        return {"error": str(e)}
 
 
-def find_contacts_node(state: AnalysisState) -> AnalysisState:
+async def find_contacts_node(state: AnalysisState) -> Optional[dict]:
     """Find LinkedIn alumni connections."""
     if state.get("error"):
-        return state
+        return None
     
     try:
         job_info = state.get("job_info", {})
@@ -171,162 +212,364 @@ def find_contacts_node(state: AnalysisState) -> AnalysisState:
         company = job_info.get("company", "")
         
         if school and company:
-            contacts = asyncio.run(search_linkedin_alumni(company, school))
-            state["contacts"] = contacts
+            contacts = await search_linkedin_alumni(company, school)
             
             if contacts:
-                add_message(
+                await aadd_message(
                     state["thread_id"],
                     "assistant",
                     f"Found {len(contacts)} potential connections from {school} at {company}!",
                     "contacts",
-                    {"contacts": contacts}
+                    {"contacts": contacts},
+                    step="find_contacts"
                 )
             else:
-                add_message(
+                await aadd_message(
                     state["thread_id"],
                     "assistant",
                     f"Couldn't find alumni connections at {company}. Try reaching out to recruiters directly.",
-                    "text"
+                    "text",
+                    step="find_contacts"
                 )
         else:
-            state["contacts"] = []
-            add_message(
+            contacts = []
+            await aadd_message(
                 state["thread_id"],
                 "assistant",
                 "Add your school in settings to find alumni connections!",
-                "text"
+                "text",
+                step="find_contacts"
             )
         
-        return state
+        return {"contacts": contacts}
     except Exception as e:
-        state["error"] = str(e)
-        return state
+        return {"error": str(e)}
 
 
-def generate_emails_node(state: AnalysisState) -> AnalysisState:
+async def generate_emails_node(state: AnalysisState) -> Optional[dict]:
     """Generate personalized outreach emails."""
     if state.get("error"):
-        return state
+        return None
     
     try:
-        contacts = state.get("contacts", [])
+        contacts = state.get("contacts") or []
         job_info = state.get("job_info", {})
         user_profile = state.get("user_profile", {})
         
-        emails = []
-        for contact in contacts[:3]:  # Limit to top 3
-            email = asyncio.run(generate_outreach_email(contact, user_profile, job_info))
-            emails.append(email)
+        # Limit to top 3, generated together rather than one after another
+        contacts = contacts[:3]
+        
+        if LLM_STREAMING == "on":
+            # Each email appears as soon as its body starts and fills in as it's written
+            messages = [
+                StreamingMessage(state["thread_id"], "assistant", "email", step=f"generate_emails:{i}")
+                for i in range(len(contacts))
+            ]
             
-            add_message(
-                state["thread_id"],
-                "assistant",
-                email.get("body", ""),
-                "email",
-                {
-                    "to": email.get("to"),
-                    "subject": email.get("subject")
-                }
-            )
+            async def show(index: int, email: dict):
+                await messages[index].update(email["body"], {"to": email.get("to"), "subject": email.get("subject")})
+            
+            emails = await generate_outreach_emails(contacts, user_profile, job_info, on_partial=show)
+            await asyncio.gather(*(show(i, email) for i, email in enumerate(emails) if email.get("body")))
+            return {"emails": emails}
+        
+        emails = await generate_outreach_emails(contacts, user_profile, job_info)
+        
+        # All emails are committed in one write
+        async with MessageWriter(state["thread_id"], step="generate_emails") as writer:
+            for email in emails:
+                writer.add_message(
+                    "assistant",
+                    email.get("body", ""),
+                    "email",
+                    {
+                        "to": email.get("to"),
+                        "subject": email.get("subject")
+                    }
+                )
         
-        state["emails"] = emails
-        return state
+        return {"emails": emails}
     except Exception as e:
-        state["error"] = str(e)
-        return state
+        return {"error": str(e)}
 
 
-def resume_suggestions_node(state: AnalysisState) -> AnalysisState:
+async def resume_suggestions_node(state: AnalysisState) -> Optional[dict]:
     """Generate resume improvement suggestions."""
     if state.get("error"):
-        return state
+        return None
     
     try:
         job_info = state.get("job_info", {})
-        resume_text = state.get("user_profile", {}).get("resumeText", "")
+        resume_text = build_resume_text(
+            state.get("resume"),
+            job_info.get("requirements", []) + job_info.get("keywords", [])
+        )
         
-        suggestions = asyncio.run(generate_resume_suggestions(resume_text, job_info))
-        state["suggestions"] = suggestions
+        # Posted as soon as the first suggestion is complete and filled in as
+        # the rest stream in (with LLM_STREAMING=on); otherwise posted at the end
+        message = StreamingMessage(state["thread_id"], "assistant", "resume_rewrite", step="resume_suggestions")
         
-        if suggestions:
-            add_message(
-                state["thread_id"],
-                "assistant",
+        async def show(partial: list[dict]):
+            await message.update(
                 "Here are some resume improvements tailored for this role:",
-                "resume_rewrite",
-                {"suggestions": suggestions}
+                {"suggestions": partial}
             )
         
-        return state
+        suggestions = await generate_resume_suggestions(resume_text, job_info, on_partial=show)
+        
+        if suggestions:
+            await show(suggestions)
+        
+        return {"suggestions": suggestions}
     except Exception as e:
-        state["error"] = str(e)
-        return state
+        return {"error": str(e)}
 
 
-def complete_node(state: AnalysisState) -> AnalysisState:
-    """Mark analysis as complete."""
+async def fit_analysis_node(state: AnalysisState) -> Optional[dict]:
+    """
+    ATS score, gaps and resume suggestions from one combined LLM call
+    (ANALYSIS_LLM_MODE=combined). Replaces the three separate branches.
+    """
     if state.get("error"):
-        add_message(
-            state["thread_id"],
-            "assistant",
-            f"Sorry, I encountered an error: {state['error']}",
-            "text"
-        )
-        update_thread(state["thread_id"], status="error")
-    else:
-        add_message(
-            state["thread_id"],
-            "assistant",
-            "Analysis complete! Good luck with your application! 🍀",
-            "text"
+        return None
+    
+    try:
+        job_info = state.get("job_info", {})
+        user_profile = state.get("user_profile", {})
+        resume = state.get("resume")
+        requirements = job_info.get("requirements", [])
+        keywords = job_info.get("keywords", [])
+        
+        local_ats = score_resume(resume, keywords, requirements)
+        result = await analyze_fit(
+            build_resume_text(resume, requirements + keywords),
+            job_info,
+            user_profile,
+            local_ats
         )
-        update_thread(state["thread_id"], status="complete")
+        
+        # Sections the combined call got wrong are redone on their own
+        fallbacks = {}
+        if result["gaps"] is None:
+            fallbacks["gaps"] = analyze_gaps(build_resume_text(resume, requirements), requirements, user_profile)
+        if result["suggestions"] is None:
+            fallbacks["suggestions"] = generate_resume_suggestions(
+                build_resume_text(resume, requirements + keywords), job_info
+            )
+        if fallbacks:
+            result.update(zip(fallbacks, await asyncio.gather(*fallbacks.values())))
+        ats_result = result["ats"] or local_ats
+        
+        async with MessageWriter(state["thread_id"], step="fit_analysis") as writer:
+            writer.add_message(
+                "assistant",
+                ats_result.get("analysis", "Analysis complete."),
+                "ats_score",
+                {
+                    "score": ats_result.get("score", 0),
+                    "matchedKeywords": ats_result.get("matchedKeywords", []),
+                    "missingKeywords": ats_result.get("missingKeywords", [])
+                }
+            )
+            writer.add_message("assistant", "Here are some areas to address:", "gaps", {"gaps": result["gaps"]})
+            if result["suggestions"]:
+                writer.add_message(
+                    "assistant",
+                    "Here are some resume improvements tailored for this role:",
+                    "resume_rewrite",
+                    {"suggestions": result["suggestions"]}
+                )
+        
+        return {"ats_result": ats_result, "gaps": result["gaps"], "suggestions": result["suggestions"]}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+async def complete_node(state: AnalysisState) -> Optional[dict]:
+    """Mark analysis as complete."""
+    async with MessageWriter(state["thread_id"], step="complete") as writer:
+        if state.get("error"):
+            writer.add_message(
+                "assistant",
+                f"Sorry, I encountered an error: {state['error']}",
+                "text"
+            )
+            writer.update_thread(status="error")
+        else:
+            writer.add_message(
+                "assistant",
+                "Analysis complete! Good luck with your application! 🍀",
+                "text"
+            )
+            writer.update_thread(status="complete")
     
-    return state
+    return None
+
+
+# Upper bound on one analysis, in seconds
+ANALYSIS_DEADLINE = float(os.getenv("ANALYSIS_DEADLINE_SECONDS", "120"))
+
+
+# Stages that only depend on the extracted job info and can run side by side.
+# `generate_emails` hangs off `find_contacts`, so that branch is two nodes long.
+ANALYSIS_BRANCHES = ["ats_score", "gap_analysis", "find_contacts", "resume_suggestions"]
+
+# With ANALYSIS_LLM_MODE=combined, `fit_analysis` stands in for the three LLM stages
+COMBINED_BRANCHES = ["fit_analysis", "find_contacts"]
 
 
 # Build the graph
-def build_analysis_graph():
+def build_analysis_graph(parallel: bool = True, checkpointer=None, llm_mode: str = None):
+    """
+    Compile the analysis workflow.
+
+    With `parallel=True` (the default) the independent stages fan out after
+    `extract_info` and fan back in at `complete`, so end-to-end latency is set
+    by the slowest branch instead of the sum of all of them. `parallel=False`
+    keeps the original one-after-another chain. A `checkpointer` saves the
+    state after every step so interrupted runs can be resumed. `llm_mode`
+    overrides ANALYSIS_LLM_MODE.
+    """
+    # LangGraph is only loaded once a graph is first needed
+    from langgraph.graph import StateGraph, START, END
+
+    combined = (llm_mode or ANALYSIS_LLM_MODE) == "combined"
     workflow = StateGraph(AnalysisState)
     
-    # Add nodes
-    workflow.add_node("scrape_job", scrape_job_node)
-    workflow.add_node("extract_info", extract_info_node)
-    workflow.add_node("ats_score", ats_score_node)
-    workflow.add_node("gap_analysis", gap_analysis_node)
-    workflow.add_node("find_contacts", find_contacts_node)
-    workflow.add_node("generate_emails", generate_emails_node)
-    workflow.add_node("resume_suggestions", resume_suggestions_node)
-    workflow.add_node("complete", complete_node)
+    # Add nodes, each timed and traced (see metrics.py)
+    workflow.add_node("scrape_job", instrument_node("scrape_job", scrape_job_node))
+    workflow.add_node("prepare_resume", instrument_node("prepare_resume", prepare_resume_node))
+    workflow.add_node("extract_info", instrument_node("extract_info", extract_info_node))
+    if combined:
+        workflow.add_node("fit_analysis", instrument_node("fit_analysis", fit_analysis_node))
+    else:
+        workflow.add_node("ats_score", instrument_node("ats_score", ats_score_node))
+        workflow.add_node("gap_analysis", instrument_node("gap_analysis", gap_analysis_node))
+        workflow.add_node("resume_suggestions", instrument_node("resume_suggestions", resume_suggestions_node))
+    workflow.add_node("find_contacts", instrument_node("find_contacts", find_contacts_node))
+    workflow.add_node("generate_emails", instrument_node("generate_emails", generate_emails_node))
+    workflow.add_node("complete", instrument_node("complete", complete_node))
     
-    # Add edges (sequential flow)
     workflow.set_entry_point("scrape_job")
-    workflow.add_edge("scrape_job", "extract_info")
-    workflow.add_edge("extract_info", "ats_score")
-    workflow.add_edge("ats_score", "gap_analysis")
-    workflow.add_edge("gap_analysis", "find_contacts")
-    workflow.add_edge("find_contacts", "generate_emails")
-    workflow.add_edge("generate_emails", "resume_suggestions")
-    workflow.add_edge("resume_suggestions", "complete")
+    
+    if parallel:
+        # Resume preprocessing overlaps with scraping and extraction
+        workflow.add_edge(START, "prepare_resume")
+        workflow.add_edge("scrape_job", "extract_info")
+        
+        # Fan out after extraction, fan back in once every branch has finished
+        branches = COMBINED_BRANCHES if combined else ANALYSIS_BRANCHES
+        for branch in branches:
+            workflow.add_edge(["extract_info", "prepare_resume"], branch)
+        workflow.add_edge("find_contacts", "generate_emails")
+        workflow.add_edge(
+            [b for b in branches if b != "find_contacts"] + ["generate_emails"],
+            "complete"
+        )
+    elif combined:
+        workflow.add_edge("scrape_job", "prepare_resume")
+        workflow.add_edge("prepare_resume", "extract_info")
+        workflow.add_edge("extract_info", "fit_analysis")
+        workflow.add_edge("fit_analysis", "find_contacts")
+        workflow.add_edge("find_contacts", "generate_emails")
+        workflow.add_edge("generate_emails", "complete")
+    else:
+        # Add edges (sequential flow)
+        workflow.add_edge("scrape_job", "prepare_resume")
+        workflow.add_edge("prepare_resume", "extract_info")
+        workflow.add_edge("extract_info", "ats_score")
+        workflow.add_edge("ats_score", "gap_analysis")
+        workflow.add_edge("gap_analysis", "find_contacts")
+        workflow.add_edge("find_contacts", "generate_emails")
+        workflow.add_edge("generate_emails", "resume_suggestions")
+        workflow.add_edge("resume_suggestions", "complete")
+    
     workflow.add_edge("complete", END)
     
-    return workflow.compile()
+    return workflow.compile(checkpointer=checkpointer)
+
+
+# Compiled on first use rather than at import, so the API starts without it
+_analysis_graph = None
+_checkpointed_graph = None
 
 
-# Create the compiled graph
-analysis_graph = build_analysis_graph()
+async def get_analysis_graph():
+    """The compiled graph, with checkpointing when a checkpoint backend is configured."""
+    global _analysis_graph, _checkpointed_graph
+    checkpointer = await get_checkpointer()
+    if checkpointer is None:
+        if _analysis_graph is None:
+            _analysis_graph = build_analysis_graph()
+        return _analysis_graph
+    if _checkpointed_graph is None:
+        _checkpointed_graph = build_analysis_graph(checkpointer=checkpointer)
+    return _checkpointed_graph
+
+
+async def analysis_checkpoint(thread_id: int):
+    """
+    Latest saved state of a thread's analysis, or None if there is none.
+    `snapshot.next` lists the steps still to run; it is empty once finished.
+    """
+    graph = await get_analysis_graph()
+    if graph.checkpointer is None:
+        return None
+    snapshot = await graph.aget_state(checkpoint_config(thread_id))
+    return snapshot if snapshot.created_at is not None else None
 
 
-def run_analysis(thread_id: int, job_url: str, user_profile: dict):
+async def run_analysis(thread_id: int, job_url: str = None, user_profile: dict = None):
     """
     Run the full analysis pipeline.
-    Called as a background task from the API.
+    Called as a background task from the API. The graph runs natively on the
+    event loop, so one process can hold many analyses in flight at once.
+
+    If the thread already has a checkpoint (a retried queue job or a resume
+    request), the run picks up after the last completed step instead, and
+    `job_url`/`user_profile` may be omitted. An identical analysis that is
+    running or recently finished is mirrored instead of recomputed.
     """
+    graph = await get_analysis_graph()
+    snapshot = await analysis_checkpoint(thread_id)
+    if snapshot is not None:
+        if not snapshot.next:
+            return
+        await aupdate_thread(thread_id, status="analyzing")
+        await _invoke(graph, None, thread_id)
+        return
+    
+    if job_url is None:
+        raise ValueError(f"No saved analysis to resume for thread {thread_id}")
+    
+    if not coalescing.COALESCING_ENABLED:
+        await _run_new(graph, thread_id, job_url, user_profile)
+        return
+    
+    resume = await prepare_resume((user_profile or {}).get("resumeText") or "")
+    key = coalescing.analysis_key(job_url, resume["hash"], user_profile)
+    source = await coalescing.claim_run(key, thread_id, ANALYSIS_DEADLINE + 15)
+    if source is not None:
+        if await coalescing.replay_run(source, thread_id, ANALYSIS_DEADLINE) is None:
+            await _fail(thread_id, "Sorry, this analysis took too long. Please try again.")
+        return
+    
+    status = None
+    try:
+        await _run_new(graph, thread_id, job_url, user_profile)
+        thread = await fetch_thread(thread_id)
+        status = thread["status"] if thread else None
+    finally:
+        await coalescing.finish_run(key, thread_id, status)
+
+
+async def _run_new(graph, thread_id: int, job_url: str, user_profile: dict):
+    """Start a fresh run of the graph for a thread."""
     initial_state: AnalysisState = {
         "thread_id": thread_id,
         "job_url": job_url,
         "user_profile": user_profile,
+        "resume": None,
         "job_raw_text": None,
         "job_info": None,
         "ats_result": None,
@@ -337,6 +580,25 @@ def run_analysis(thread_id: int, job_url: str, user_profile: dict):
         "error": None,
     }
     
-    # Run the graph
-    analysis_graph.invoke(initial_state)
+    await _invoke(graph, initial_state, thread_id)
+
+
+async def _invoke(graph, graph_input, thread_id: int):
+    """Run (or, with `graph_input=None`, resume) the graph under the analysis deadline."""
+    # Every external call is clamped to the overall deadline, so stages fail
+    # fast and `complete` still reports; the hard timeout is a backstop.
+    with analysis_deadline(ANALYSIS_DEADLINE):
+        try:
+            await asyncio.wait_for(
+                graph.ainvoke(graph_input, checkpoint_config(thread_id)),
+                ANALYSIS_DEADLINE + 15
+            )
+        except asyncio.TimeoutError:
+            await _fail(thread_id, "Sorry, this analysis took too long. Please try again.")
+
+
+async def _fail(thread_id: int, message: str):
+    async with MessageWriter(thread_id) as writer:
+        writer.add_message("assistant", message, "text")
+        writer.update_thread(status="error")
 
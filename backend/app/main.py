@@ -1,4 +1,6 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import asyncio
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import os
@@ -7,12 +9,77 @@ import os
 load_dotenv()
 
 # Import routers
-from app.routers import analyze
+from app.routers import analyze, threads, resume
+from app.services import exa_client, openai_client, database, events, checkpoints, metrics, resume_files
+
+# "on" builds clients, the compiled graph and connection pools before the app
+# reports ready; "off" (default) builds each on first use
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "off")
+
+async def warm_up():
+    """Build what the first analysis would otherwise pay for."""
+    from app.graphs.job_analysis import get_analysis_graph
+    from app.services.prompts import load_tokenizer
+    
+    async def ping_database():
+        async with database.aconnection() as conn:
+            await conn.execute("SELECT 1")
+    
+    async def warm_tokenizer():
+        # Loads (and on first run downloads) the encoding tables. Requests
+        # estimate token counts if this fails, so it is only reported
+        if not await asyncio.to_thread(load_tokenizer):
+            raise RuntimeError("encoding unavailable, estimating token counts")
+    
+    openai_client.get_client()
+    exa_client.get_http_client()
+    for name, step in [("graph", get_analysis_graph), ("database", ping_database), ("tokenizer", warm_tokenizer)]:
+        try:
+            await step()
+        except Exception as e:
+            # Still serve traffic; the first request retries this
+            print(f"Warm-up of {name} failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(database.ensure_schema)
+    if analyze.EXECUTION_MODE == "queue":
+        # POST /analyze enqueues into this table even before any worker has started
+        from app.services.job_queue import get_job_queue
+        await asyncio.to_thread(get_job_queue().ensure_schema)
+    if STARTUP_WARMUP == "on":
+        await warm_up()
+    
+    # The local queue backend lives in this process, so its workers must too
+    stop_workers = asyncio.Event()
+    workers = None
+    if analyze.EXECUTION_MODE == "queue" and os.getenv("JOB_QUEUE_BACKEND") == "local":
+        from app.worker import run_workers
+        workers = asyncio.create_task(run_workers(
+            int(os.getenv("WORKER_CONCURRENCY", "8")),
+            float(os.getenv("WORKER_VISIBILITY_TIMEOUT", "300")),
+            float(os.getenv("WORKER_POLL_INTERVAL", "1.0")),
+            stop_workers
+        ))
+    
+    yield
+    
+    if workers:
+        stop_workers.set()
+        await workers
+    # Release pooled keep-alive connections to external APIs
+    await exa_client.aclose()
+    await openai_client.aclose()
+    await events.close()
+    await checkpoints.close()
+    resume_files.close()
+    await database.close_pools()
 
 app = FastAPI(
     title="JobMaxx API",
     description="AI-powered job application analysis backend",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS configuration
@@ -32,6 +99,8 @@ app.add_middleware(
 
 # Include routers
 app.include_router(analyze.router, prefix="/api")
+app.include_router(threads.router, prefix="/api")
+app.include_router(resume.router, prefix="/api")
 
 @app.get("/")
 async def root():
@@ -41,3 +110,9 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Node, external call, rate limit and token metrics for Prometheus to scrape."""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
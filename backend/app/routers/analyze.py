@@ -1,9 +1,21 @@
-from fastapi import APIRouter, BackgroundTasks
+from fastapi import APIRouter, BackgroundTasks, HTTPException
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import Optional
+import asyncio
 import os
 
-from app.graphs.job_analysis import run_analysis
+from app.graphs.job_analysis import run_analysis, analysis_checkpoint
+from app.services.job_queue import get_job_queue
+from app.services.batch_analysis import analyze_job_batch
+from app.services.admission import admission, AdmissionRejected
+
+# "background" runs analyses inside the web process; "queue" hands them to
+# the durable job queue consumed by `python -m app.worker`.
+EXECUTION_MODE = os.getenv("ANALYSIS_EXECUTION_MODE", "background")
+
+# Largest number of URLs accepted by one batch request
+MAX_BATCH_URLS = int(os.getenv("MAX_BATCH_URLS", "50"))
 
 router = APIRouter()
 
@@ -22,19 +34,98 @@ class AnalyzeRequest(BaseModel):
     threadId: int
     jobUrl: str
     userProfile: UserProfile
+    # Caller's user id, for the per-user cap on concurrent analyses;
+    # required while MAX_ANALYSES_PER_USER is set
+    userId: Optional[str] = None
+
+class BatchAnalyzeRequest(BaseModel):
+    jobUrls: list[str]
+    userProfile: UserProfile
+    userId: Optional[str] = None
+
+def _rejected(e: AdmissionRejected) -> JSONResponse:
+    """Fast refusal telling the caller when to retry."""
+    return JSONResponse(
+        status_code=e.status_code,
+        content={"detail": e.detail, "queuePosition": e.queue_position, "retryAfter": e.retry_after},
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+def _admit(user_id: Optional[str]):
+    """Reserve an admission slot, insisting on a user id while a per-user cap is set."""
+    if admission.max_per_user and not user_id:
+        raise HTTPException(status_code=422, detail="userId is required")
+    return admission.admit(user_id)
 
 @router.post("/analyze")
 async def analyze_job(request: AnalyzeRequest, background_tasks: BackgroundTasks):
     """
     Trigger job analysis. Runs in background and updates messages in DB.
     """
-    # Run analysis in background
-    background_tasks.add_task(
-        run_analysis,
-        thread_id=request.threadId,
-        job_url=request.jobUrl,
-        user_profile=request.userProfile.model_dump()
-    )
+    payload = {
+        "thread_id": request.threadId,
+        "job_url": request.jobUrl,
+        "user_profile": request.userProfile.model_dump()
+    }
+    
+    if EXECUTION_MODE == "queue":
+        # Accepting the request is a single insert; workers do the rest
+        job_id = await asyncio.to_thread(get_job_queue().enqueue, payload)
+        return {"status": "analysis_queued", "threadId": request.threadId, "jobId": job_id}
     
-    return {"status": "analysis_started", "threadId": request.threadId}
+    # Run analysis in background once admitted; queuePosition 0 means it starts now
+    try:
+        ticket = _admit(request.userId)
+    except AdmissionRejected as e:
+        return _rejected(e)
+    background_tasks.add_task(admission.run, ticket, lambda: run_analysis(**payload))
+    
+    return {"status": "analysis_started", "threadId": request.threadId, "queuePosition": ticket.position}
+
+
 
+@router.post("/analyze/batch")
+async def analyze_batch(request: BatchAnalyzeRequest):
+    """
+    Score many job postings against one profile and return them ranked by
+    ATS score. Duplicate URLs are analyzed once. A batch takes one admission
+    slot like a single analysis and runs once admitted.
+    """
+    if not request.jobUrls:
+        raise HTTPException(status_code=422, detail="jobUrls must not be empty")
+    if len(request.jobUrls) > MAX_BATCH_URLS:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_BATCH_URLS} URLs per batch")
+    
+    try:
+        ticket = _admit(request.userId)
+    except AdmissionRejected as e:
+        return _rejected(e)
+    return await admission.run(ticket, lambda: analyze_job_batch(request.jobUrls, request.userProfile.model_dump()))
+
+
+@router.post("/analyze/{thread_id}/resume")
+async def resume_analysis(thread_id: int, background_tasks: BackgroundTasks, userId: Optional[str] = None):
+    """
+    Continue an interrupted analysis from its last completed step.
+    Finished steps are not re-run and their messages are not posted again.
+    """
+    snapshot = await analysis_checkpoint(thread_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="No saved analysis for this thread")
+    if not snapshot.next:
+        raise HTTPException(status_code=409, detail="Analysis already finished")
+    
+    payload = {"thread_id": thread_id}
+    remaining = list(snapshot.next)
+    
+    if EXECUTION_MODE == "queue":
+        job_id = await asyncio.to_thread(get_job_queue().enqueue, payload)
+        return {"status": "analysis_queued", "threadId": thread_id, "jobId": job_id, "remainingSteps": remaining}
+    
+    try:
+        ticket = _admit(userId)
+    except AdmissionRejected as e:
+        return _rejected(e)
+    background_tasks.add_task(admission.run, ticket, lambda: run_analysis(**payload))
+    
+    return {"status": "analysis_resumed", "threadId": thread_id, "remainingSteps": remaining, "queuePosition": ticket.position}
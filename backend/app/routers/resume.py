@@ -0,0 +1,27 @@
+from fastapi import APIRouter, File, HTTPException, UploadFile
+
+from app.services.resume_files import parse_resume_file, MAX_RESUME_BYTES
+
+# Bytes read from the upload at a time
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+router = APIRouter()
+
+@router.post("/resume/parse")
+async def parse_resume(file: UploadFile = File(...)):
+    """
+    Extract the text of an uploaded PDF or DOCX resume, for use as the
+    profile's resumeText. Parsing runs in a separate process.
+    """
+    # Read in chunks and stop past the limit, so oversized uploads are never held in full
+    chunks, size = [], 0
+    while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+        size += len(chunk)
+        if size > MAX_RESUME_BYTES:
+            raise HTTPException(status_code=413, detail=f"Resume files are limited to {MAX_RESUME_BYTES // (1024 * 1024)} MB")
+        chunks.append(chunk)
+
+    try:
+        return await parse_resume_file(b"".join(chunks), file.filename or "")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
@@ -0,0 +1,104 @@
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import asyncio
+import json
+
+from app.services import events
+from app.services.database import fetch_thread, fetch_messages
+
+router = APIRouter()
+
+# Seconds between keep-alive comments so proxies don't drop idle streams
+HEARTBEAT_INTERVAL = 15
+
+
+def _sse(event: str, data: dict, event_id: int = None) -> str:
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+@router.get("/threads/{thread_id}/events")
+async def thread_events(
+    thread_id: int,
+    after: int = 0,
+    last_event_id: Optional[str] = Header(default=None)
+):
+    """
+    Stream a thread's messages as Server-Sent Events while it is analyzed.
+
+    Messages with id greater than `after` (or the `Last-Event-ID` header sent
+    by a reconnecting EventSource) are replayed first, then new ones are
+    pushed as the graph writes them. If events may have been dropped (see
+    events.py), the thread and its messages are read again. The stream ends
+    once the thread reaches a final status.
+    """
+    if last_event_id and last_event_id.isdigit():
+        after = max(after, int(last_event_id))
+
+    # Subscribe before reading the backlog so nothing written in between is missed
+    try:
+        queue = await events.subscribe(thread_id)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Live updates are unavailable; try again shortly")
+
+    thread = await fetch_thread(thread_id)
+    if thread is None:
+        events.unsubscribe(thread_id, queue)
+        raise HTTPException(status_code=404, detail="Thread not found")
+
+    async def stream():
+        last_id = after
+        try:
+            yield _sse("thread", thread)
+            for row in await fetch_messages(thread_id, after):
+                last_id = row["id"]
+                yield _sse("message", events.message_event(row), last_id)
+
+            if thread["status"] in events.FINAL_STATUSES:
+                return
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+
+                if event["type"] == "message":
+                    # Already sent as part of the backlog
+                    if event["data"]["id"] <= last_id:
+                        continue
+                    last_id = event["data"]["id"]
+                    yield _sse("message", event["data"], last_id)
+                elif event["type"] == "message_update":
+                    # New content for a message that is still streaming in
+                    yield _sse("message_update", event["data"])
+                elif event["type"] == "resync":
+                    # Sent messages may have changed too, so they go out as updates
+                    for row in await fetch_messages(thread_id, after):
+                        if row["id"] <= last_id:
+                            yield _sse("message_update", events.message_event(row))
+                        else:
+                            last_id = row["id"]
+                            yield _sse("message", events.message_event(row), last_id)
+                    current = await fetch_thread(thread_id)
+                    if current is not None:
+                        yield _sse("thread", current)
+                        if current["status"] in events.FINAL_STATUSES:
+                            return
+                else:
+                    yield _sse("thread", event["data"])
+                    if event["data"].get("status") in events.FINAL_STATUSES:
+                        return
+        finally:
+            events.unsubscribe(thread_id, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
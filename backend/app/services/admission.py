@@ -0,0 +1,138 @@
+"""
+Admission control for analyses run inside the web process.
+
+Without it every POST /api/analyze starts work immediately, so a spike
+slows every in-flight analysis at once. Here at most MAX_CONCURRENT_ANALYSES
+run at a time, up to MAX_QUEUED_ANALYSES more wait in FIFO order, and one
+user can have at most MAX_ANALYSES_PER_USER running or waiting. Requests
+past those limits are turned away at once with an estimated wait, so
+admitted analyses keep a predictable latency instead of sharing an
+overloaded process. A limit of 0 disables it.
+
+Slots are reserved when the request is accepted (`admit`) and held until
+the analysis finishes (`run`), so the counts cover work that has been
+promised but not yet started.
+"""
+
+from collections import deque
+import asyncio
+import math
+import os
+
+from app.services.metrics import analyses_admitted, analyses_in_flight
+
+MAX_CONCURRENT_ANALYSES = int(os.getenv("MAX_CONCURRENT_ANALYSES", "16"))
+MAX_QUEUED_ANALYSES = int(os.getenv("MAX_QUEUED_ANALYSES", "64"))
+MAX_ANALYSES_PER_USER = int(os.getenv("MAX_ANALYSES_PER_USER", "3"))
+
+# Initial guess at an analysis's duration, before any have finished
+EXPECTED_ANALYSIS_SECONDS = float(os.getenv("EXPECTED_ANALYSIS_SECONDS", "30"))
+
+# Weight of the newest duration in the running average
+DURATION_SMOOTHING = 0.2
+
+
+class AdmissionRejected(Exception):
+    """Raised by `admit` when a limit is reached; carries the HTTP response details."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int, queue_position: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+        self.queue_position = queue_position
+
+
+class Ticket:
+    """A reserved slot: running now (position 0) or waiting at `position`."""
+
+    def __init__(self, user_id: str = None):
+        self.user_id = user_id
+        self.turn = None
+        self.position = 0
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent: int, max_queued: int, max_per_user: int):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.max_per_user = max_per_user
+        self.running = 0
+        self.waiting = deque()
+        self.per_user = {}
+        self.average_seconds = EXPECTED_ANALYSIS_SECONDS
+
+    def _retry_after(self, ahead: int) -> int:
+        """Seconds until a slot frees up with `ahead` analyses in front."""
+        if not self.max_concurrent:
+            return 1
+        rounds = math.floor(ahead / self.max_concurrent) + 1
+        return max(1, math.ceil(rounds * self.average_seconds))
+
+    def admit(self, user_id: str = None) -> Ticket:
+        """Reserve a slot or raise AdmissionRejected."""
+        ahead = len(self.waiting)
+        if user_id and self.max_per_user and self.per_user.get(user_id, 0) >= self.max_per_user:
+            analyses_admitted.labels(outcome="user_limit").inc()
+            raise AdmissionRejected(
+                429, f"At most {self.max_per_user} analyses can run at once per user",
+                self._retry_after(ahead), ahead + 1
+            )
+
+        ticket = Ticket(user_id)
+        if not self.max_concurrent or self.running < self.max_concurrent:
+            self.running += 1
+        elif self.max_queued and ahead >= self.max_queued:
+            analyses_admitted.labels(outcome="queue_full").inc()
+            raise AdmissionRejected(
+                503, "Too many analyses are waiting; try again shortly", self._retry_after(ahead), ahead + 1
+            )
+        else:
+            ticket.turn = asyncio.get_running_loop().create_future()
+            self.waiting.append(ticket)
+            ticket.position = len(self.waiting)
+
+        if user_id:
+            self.per_user[user_id] = self.per_user.get(user_id, 0) + 1
+        analyses_admitted.labels(outcome="running" if ticket.turn is None else "queued").inc()
+        self._report()
+        return ticket
+
+    def _release(self, ticket: Ticket):
+        if ticket.user_id:
+            remaining = self.per_user.get(ticket.user_id, 1) - 1
+            if remaining:
+                self.per_user[ticket.user_id] = remaining
+            else:
+                self.per_user.pop(ticket.user_id, None)
+
+        if ticket in self.waiting:
+            # Gave up while still waiting; its slot was never taken
+            self.waiting.remove(ticket)
+        elif self.waiting:
+            # Hand the slot straight to the next in line
+            self.waiting.popleft().turn.set_result(None)
+        else:
+            self.running -= 1
+        self._report()
+
+    def _report(self):
+        analyses_in_flight.labels(state="running").set(self.running)
+        analyses_in_flight.labels(state="queued").set(len(self.waiting))
+
+    async def run(self, ticket: Ticket, work):
+        """Wait for the ticket's turn, await `work()`, then free the slot."""
+        loop = asyncio.get_running_loop()
+        try:
+            if ticket.turn is not None:
+                await ticket.turn
+            started = loop.time()
+            result = await work()
+            elapsed = loop.time() - started
+            self.average_seconds += DURATION_SMOOTHING * (elapsed - self.average_seconds)
+            return result
+        finally:
+            self._release(ticket)
+
+
+admission = AdmissionController(MAX_CONCURRENT_ANALYSES, MAX_QUEUED_ANALYSES, MAX_ANALYSES_PER_USER)
@@ -0,0 +1,310 @@
+"""
+Local ATS keyword scoring.
+
+Scores a resume against a posting's keywords and requirements without an
+LLM round trip. Text is tokenized, synonyms are folded onto one canonical
+form and tokens are lightly stemmed, then every keyword variant is found in
+a single pass over the resume with a token-level Aho-Corasick automaton.
+
+ATS_SCORING_MODE picks how `score_ats` runs:
+- local (default): this module only; deterministic and takes milliseconds.
+- refine: the local result plus one LLM call that adjusts it and writes the analysis.
+- llm: the original LLM-only scoring.
+- semantic: this module plus embedding similarity (see semantic.py), so
+  related experience counts without an LLM round trip.
+"""
+
+from collections import deque
+from functools import lru_cache
+import os
+import re
+
+ATS_SCORING_MODE = os.getenv("ATS_SCORING_MODE", "local")
+
+# Share of the score that comes from keyword coverage; the rest is requirement coverage
+KEYWORD_WEIGHT = 0.7
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*(?:\.[a-z0-9+#]+)*")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "into", "is", "it",
+    "of", "on", "or", "our", "the", "to", "we", "with", "you", "your", "will", "have", "has",
+    "experience", "knowledge", "ability", "strong", "skills", "skill", "working", "work",
+    "years", "year", "plus", "preferred", "required", "proficiency", "familiarity", "understanding",
+    "using", "including", "etc", "least", "excellent", "good", "solid", "proven",
+}
+
+# Aliases folded onto one canonical phrase before matching (both directions match)
+SYNONYMS = {
+    "js": "javascript",
+    "ecmascript": "javascript",
+    "ts": "typescript",
+    "py": "python",
+    "golang": "go",
+    "k8s": "kubernetes",
+    "postgres": "postgresql",
+    "psql": "postgresql",
+    "mongo": "mongodb",
+    "nodejs": "node.js",
+    "reactjs": "react",
+    "react.js": "react",
+    "vuejs": "vue",
+    "vue.js": "vue",
+    "nextjs": "next.js",
+    "tf": "tensorflow",
+    "sklearn": "scikit-learn",
+    "scikit": "scikit-learn",
+    "ml": "machine learning",
+    "ai": "artificial intelligence",
+    "dl": "deep learning",
+    "nlp": "natural language processing",
+    "llm": "large language model",
+    "llms": "large language model",
+    "aws": "amazon web services",
+    "gcp": "google cloud platform",
+    "google cloud": "google cloud platform",
+    "azure": "microsoft azure",
+    "ci/cd": "continuous integration",
+    "cicd": "continuous integration",
+    "oop": "object oriented programming",
+    "ux": "user experience",
+    "ui": "user interface",
+    "qa": "quality assurance",
+    "db": "database",
+    "dbs": "database",
+    "excel": "microsoft excel",
+    "ms excel": "microsoft excel",
+    "b.s.": "bachelor",
+    "bs": "bachelor",
+    "bachelors": "bachelor",
+    "masters": "master",
+    "phd": "doctorate",
+}
+
+SUFFIXES = ("ments", "ment", "ings", "ing", "ies", "ied", "ers", "er", "ed")
+
+# Plurals that add "es" rather than "s" ("classes", "matches", "boxes")
+ES_PLURALS = ("sses", "shes", "ches", "xes", "zes")
+
+# Words ending in "s" that aren't plurals ("access", "status", "analysis")
+NOT_PLURAL = ("ss", "us", "is")
+
+
+def stem(token: str) -> str:
+    """Light suffix stripping; enough to match "developing" to "develop"."""
+    if len(token) < 4 or not token.isalpha():
+        return token
+    if len(token) == 4:
+        # Short words only lose a plural "s" ("apis", "gpus")
+        return token[:-1] if token.endswith("s") and not token.endswith("ss") else token
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            base = token[: -len(suffix)]
+            if suffix in ("ies", "ied"):
+                return base + "y"
+            return base
+    if token.endswith(ES_PLURALS):
+        return token[:-2]
+    # Plain "s" first, so "databases" and "services" keep their "e"
+    if token.endswith("s") and not token.endswith(NOT_PLURAL):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word tokens, keeping tech names like c++, c#, node.js intact."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def _canonical(tokens: list[str]) -> list[str]:
+    """
+    Expand synonyms and stem. Expansion is idempotent: "azure" after
+    "microsoft" stays "microsoft azure" rather than "microsoft microsoft azure".
+    """
+    result = []
+    for token in tokens:
+        canonical = SYNONYMS.get(token)
+        if not canonical:
+            result.append(stem(token))
+            continue
+        expansion = [stem(t) for t in tokenize(canonical)]
+        head = expansion[:-1]
+        if head and result[-len(head):] == head and expansion[-1] == stem(token):
+            expansion = expansion[-1:]
+        result.extend(expansion)
+    return result
+
+
+@lru_cache(maxsize=4096)
+def normalize_phrase(phrase: str) -> tuple:
+    """Canonical token sequence for a keyword or phrase."""
+    phrase = phrase.lower().strip()
+    phrase = SYNONYMS.get(phrase, phrase)
+    return tuple(_canonical(tokenize(phrase)))
+
+
+def normalize_tokens(text: str) -> list[str]:
+    """Canonical token stream for free text (a resume or requirement)."""
+    return _canonical(tokenize(text))
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over token sequences. Built once per keyword set,
+    it finds every keyword occurrence in one linear scan of the text.
+    """
+
+    def __init__(self, keywords: tuple):
+        self.keywords = keywords
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [set()]
+
+        for index, keyword in enumerate(keywords):
+            for variant in self._variants(keyword):
+                self._add(variant, index)
+        self._build_failure_links()
+
+    @staticmethod
+    def _variants(keyword: str):
+        variants = {normalize_phrase(keyword)}
+        # "Python/Django" or "SQL (PostgreSQL)" match either part
+        for part in re.split(r"[/,()]| or ", keyword):
+            if part.strip() and part.strip() != keyword:
+                variants.add(normalize_phrase(part))
+        return [v for v in variants if v]
+
+    def _add(self, tokens: tuple, index: int):
+        state = 0
+        for token in tokens:
+            nxt = self._goto[state].get(token)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][token] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(set())
+            state = nxt
+        self._output[state].add(index)
+
+    def _build_failure_links(self):
+        # Depth-1 states keep their failure link to the root
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(token, 0)
+                self._output[nxt] |= self._output[self._fail[nxt]]
+
+    def find(self, tokens: list[str]) -> set:
+        """Return the indices of keywords that occur in `tokens`."""
+        found = set()
+        state = 0
+        for token in tokens:
+            while state and token not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(token, 0)
+            if self._output[state]:
+                found |= self._output[state]
+        return found
+
+
+@lru_cache(maxsize=256)
+def get_matcher(keywords: tuple) -> KeywordMatcher:
+    """Compiled matchers are reused for postings with the same keyword list."""
+    return KeywordMatcher(keywords)
+
+
+def _dedupe(keywords: list[str]) -> tuple:
+    seen = set()
+    unique = []
+    for keyword in keywords:
+        key = normalize_phrase(keyword)
+        if keyword.strip() and key and key not in seen:
+            seen.add(key)
+            unique.append(keyword.strip())
+    return tuple(unique)
+
+
+def _requirement_coverage(resume_tokens: set, requirements: list[str]) -> float:
+    """Average share of each requirement's content words that appear in the resume."""
+    coverages = []
+    for requirement in requirements:
+        terms = {t for t in normalize_tokens(requirement) if t not in STOPWORDS and not t.isdigit()}
+        if terms:
+            coverages.append(len(terms & resume_tokens) / len(terms))
+    return sum(coverages) / len(coverages) if coverages else 0.0
+
+
+def score_resume(resume: dict, job_keywords: list[str], job_requirements: list[str]) -> dict:
+    """
+    Compute the ATS result locally from a preprocessed resume (see resume.py).
+    Returns the same schema as the LLM scorer: score (0-100), matchedKeywords,
+    missingKeywords and a short analysis.
+    """
+    keywords = _dedupe(job_keywords or [])
+    requirements = [r for r in (job_requirements or []) if r and r.strip()]
+
+    if not resume or not resume.get("text"):
+        return {
+            "score": 0,
+            "matchedKeywords": [],
+            "missingKeywords": list(keywords),
+            "analysis": "No resume provided, so nothing could be matched."
+        }
+
+    resume_tokens = resume["tokens"]
+    found = get_matcher(keywords).find(resume_tokens) if keywords else set()
+    matched = [k for i, k in enumerate(keywords) if i in found]
+    missing = [k for i, k in enumerate(keywords) if i not in found]
+
+    keyword_coverage = len(matched) / len(keywords) if keywords else None
+    requirement_coverage = _requirement_coverage(set(resume_tokens), requirements) if requirements else None
+
+    if keyword_coverage is not None and requirement_coverage is not None:
+        ratio = KEYWORD_WEIGHT * keyword_coverage + (1 - KEYWORD_WEIGHT) * requirement_coverage
+    else:
+        ratio = keyword_coverage if keyword_coverage is not None else (requirement_coverage or 0.0)
+    score = round(100 * ratio)
+
+    if keywords:
+        analysis = f"Your resume matches {len(matched)} of {len(keywords)} key terms for this role."
+        if missing:
+            analysis += f" Consider adding evidence of: {', '.join(missing[:5])}."
+    else:
+        analysis = "The posting lists no specific keywords; the score reflects overlap with its requirements."
+
+    return {
+        "score": max(0, min(100, score)),
+        "matchedKeywords": matched,
+        "missingKeywords": missing,
+        "analysis": analysis
+    }
+
+
+async def score_ats(resume: dict, job_keywords: list[str], job_requirements: list[str], mode: str = None) -> dict:
+    """Score a preprocessed resume using the configured ATS_SCORING_MODE."""
+    from app.services.openai_client import calculate_ats_score, refine_ats_score
+    from app.services.prompts import build_resume_text
+
+    mode = mode or ATS_SCORING_MODE
+    focus = list(job_keywords or []) + list(job_requirements or [])
+    if mode == "semantic":
+        from app.services.semantic import semantic_score
+        try:
+            return await semantic_score(resume, job_keywords, job_requirements)
+        except Exception as e:
+            print(f"Semantic scoring failed, using keyword matching: {e}")
+    if mode == "llm":
+        result = await calculate_ats_score(build_resume_text(resume, focus), job_keywords, job_requirements)
+        if result is not None:
+            return result
+
+    result = score_resume(resume, job_keywords, job_requirements)
+    if mode == "refine" and resume and resume.get("text"):
+        return await refine_ats_score(build_resume_text(resume, focus), job_requirements, result)
+    return result
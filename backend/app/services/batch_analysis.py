@@ -0,0 +1,109 @@
+"""
+Batch analysis of many job postings for one profile.
+
+Instead of one thread and one full pipeline per URL, a batch de-duplicates
+the URLs, scrapes them in multi-URL Exa requests, preprocesses the resume
+once, and runs extraction and ATS scoring for every posting under a shared
+concurrency cap. The result is the batch ranked by ATS score.
+
+Batches run at BACKGROUND priority inside the request, so they are bounded
+by BATCH_DEADLINE_SECONDS: postings not scored by then come back with an
+error instead of holding the response while interactive traffic goes first.
+"""
+
+import asyncio
+import os
+
+from app.services.exa_client import scrape_job_postings, normalize_url
+from app.services.openai_client import extract_job_info
+from app.services.ats_scorer import score_ats
+from app.services.resume import prepare_resume
+from app.services.rate_limit import priority, BACKGROUND
+from app.services.resilience import analysis_deadline
+
+# Postings extracted and scored at the same time within one batch
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+# Upper bound on one batch request, in seconds
+BATCH_DEADLINE = float(os.getenv("BATCH_DEADLINE_SECONDS", "60"))
+
+TIMED_OUT = "Not analyzed in time; try this posting again later."
+
+
+async def _analyze_posting(url: str, posting: dict, resume: dict, semaphore: asyncio.Semaphore) -> dict:
+    if not posting["text"]:
+        return {"url": url, "error": "Couldn't read the job posting at that URL."}
+
+    try:
+        async with semaphore:
+            job_info = await extract_job_info(posting["text"])
+            result = await score_ats(resume, job_info.get("keywords", []), job_info.get("requirements", []))
+    except Exception as e:
+        print(f"Error analyzing {url}: {e}")
+        return {"url": url, "error": str(e)}
+
+    return {
+        "url": url,
+        "company": job_info.get("company"),
+        "role": job_info.get("role"),
+        "location": job_info.get("location"),
+        "score": result.get("score", 0),
+        "matchedKeywords": result.get("matchedKeywords", []),
+        "missingKeywords": result.get("missingKeywords", []),
+    }
+
+
+async def analyze_job_batch(job_urls: list[str], user_profile: dict) -> dict:
+    """
+    Score every posting in `job_urls` against the profile's resume.
+    Scored postings are ranked best first; postings that failed follow with
+    an `error` instead of a score.
+    """
+    urls = {}
+    for url in job_urls:
+        urls.setdefault(normalize_url(url), url)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + BATCH_DEADLINE
+
+    # Batch work yields to interactive analyses at the rate limiter. The
+    # deadline clamps each call; the waits below also bound time spent queued
+    with priority(BACKGROUND), analysis_deadline(BATCH_DEADLINE):
+        try:
+            resume, postings = await asyncio.wait_for(
+                asyncio.gather(
+                    prepare_resume(user_profile.get("resumeText") or ""),
+                    scrape_job_postings(list(urls.values()))
+                ),
+                BATCH_DEADLINE
+            )
+        except asyncio.TimeoutError:
+            resume, postings = None, {}
+
+        semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+        tasks = {
+            key: asyncio.ensure_future(_analyze_posting(url, postings[key], resume, semaphore))
+            for key, url in urls.items() if key in postings
+        }
+        if tasks:
+            await asyncio.wait(tasks.values(), timeout=max(0.0, deadline - loop.time()))
+        for task in tasks.values():
+            task.cancel()
+
+    results = [
+        tasks[key].result() if key in tasks and tasks[key].done() and not tasks[key].cancelled()
+        else {"url": url, "error": TIMED_OUT}
+        for key, url in urls.items()
+    ]
+
+    scored = sorted((r for r in results if "error" not in r), key=lambda r: -r["score"])
+    for rank, result in enumerate(scored, start=1):
+        result["rank"] = rank
+    failed = [r for r in results if "error" in r]
+
+    return {
+        "results": scored + failed,
+        "analyzed": len(scored),
+        "failed": len(failed),
+        "duplicatesSkipped": len(job_urls) - len(urls),
+    }
@@ -0,0 +1,307 @@
+"""
+Two-tier cache for expensive external results.
+
+Each `Cache` has a size-bounded LRU in memory and, depending on
+CACHE_BACKEND, a persistent tier shared across processes and restarts:
+
+- postgres (default): the `cache_entries` table
+- disk: one JSON file per entry under CACHE_DIR
+- none: memory only
+
+Values must be JSON-serializable. `get_or_fetch` also de-duplicates
+concurrent misses for the same key, so one fetch serves every waiter.
+`get_many` and `set_many` read or write many keys with one round trip to
+the persistent tier.
+"""
+
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+from psycopg.types.json import Jsonb
+
+from app.services.database import aconnection
+from app.services.rate_limit import priority, BACKGROUND
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "postgres")
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+
+
+def hash_key(*parts: str) -> str:
+    """Content-address a key from its parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class _PostgresStore:
+    _schema_ready = False
+
+    async def _ensure_schema(self, conn):
+        if _PostgresStore._schema_ready:
+            return
+        await conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value JSONB NOT NULL,
+                stored_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                expires_at TIMESTAMPTZ NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+            """
+        )
+        _PostgresStore._schema_ready = True
+
+    async def get(self, namespace: str, key: str):
+        async with aconnection() as conn:
+            await self._ensure_schema(conn)
+            cur = await conn.execute(
+                """
+                SELECT value, extract(epoch FROM stored_at), extract(epoch FROM expires_at)
+                FROM cache_entries
+                WHERE namespace = %s AND key = %s AND expires_at > now()
+                """,
+                (namespace, key)
+            )
+            row = await cur.fetchone()
+            return (row[0], float(row[1]), float(row[2])) if row else None
+
+    async def get_many(self, namespace: str, keys: list[str]) -> dict:
+        async with aconnection() as conn:
+            await self._ensure_schema(conn)
+            cur = await conn.execute(
+                """
+                SELECT key, value, extract(epoch FROM stored_at), extract(epoch FROM expires_at)
+                FROM cache_entries
+                WHERE namespace = %s AND key = ANY(%s) AND expires_at > now()
+                """,
+                (namespace, keys)
+            )
+            return {row[0]: (row[1], float(row[2]), float(row[3])) for row in await cur.fetchall()}
+
+    async def set(self, namespace: str, key: str, value, stored_at: float, expires_at: float):
+        await self.set_many(namespace, [(key, value, stored_at, expires_at)])
+
+    async def set_many(self, namespace: str, entries: list[tuple]):
+        async with aconnection() as conn:
+            await self._ensure_schema(conn)
+            # executemany pipelines the upserts into one round trip
+            async with conn.cursor() as cur:
+                await cur.executemany(
+                    """
+                    INSERT INTO cache_entries (namespace, key, value, stored_at, expires_at)
+                    VALUES (%s, %s, %s, to_timestamp(%s), to_timestamp(%s))
+                    ON CONFLICT (namespace, key) DO UPDATE
+                    SET value = EXCLUDED.value, stored_at = EXCLUDED.stored_at, expires_at = EXCLUDED.expires_at
+                    """,
+                    [(namespace, key, Jsonb(value), stored_at, expires_at) for key, value, stored_at, expires_at in entries]
+                )
+
+    async def delete(self, namespace: str, key: str):
+        async with aconnection() as conn:
+            await self._ensure_schema(conn)
+            await conn.execute("DELETE FROM cache_entries WHERE namespace = %s AND key = %s", (namespace, key))
+
+
+class _DiskStore:
+    def _path(self, namespace: str, key: str) -> str:
+        return os.path.join(CACHE_DIR, namespace, f"{hash_key(key)}.json")
+
+    def _read(self, namespace: str, key: str):
+        try:
+            with open(self._path(namespace, key)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry["expires_at"] <= time.time():
+            return None
+        return entry["value"], entry["stored_at"], entry["expires_at"]
+
+    def _write(self, namespace: str, key: str, value, stored_at: float, expires_at: float):
+        path = self._path(namespace, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"value": value, "stored_at": stored_at, "expires_at": expires_at}, f)
+        os.replace(tmp_path, path)
+
+    def _remove(self, namespace: str, key: str):
+        try:
+            os.remove(self._path(namespace, key))
+        except OSError:
+            pass
+
+    async def get(self, namespace: str, key: str):
+        return await asyncio.to_thread(self._read, namespace, key)
+
+    async def get_many(self, namespace: str, keys: list[str]) -> dict:
+        def read():
+            entries = {key: self._read(namespace, key) for key in keys}
+            return {key: entry for key, entry in entries.items() if entry is not None}
+
+        return await asyncio.to_thread(read)
+
+    async def set(self, namespace: str, key: str, value, stored_at: float, expires_at: float):
+        await asyncio.to_thread(self._write, namespace, key, value, stored_at, expires_at)
+
+    async def set_many(self, namespace: str, entries: list[tuple]):
+        def write():
+            for entry in entries:
+                self._write(namespace, *entry)
+
+        await asyncio.to_thread(write)
+
+    async def delete(self, namespace: str, key: str):
+        await asyncio.to_thread(self._remove, namespace, key)
+
+
+def _persistent_store():
+    if CACHE_BACKEND == "postgres":
+        return _PostgresStore()
+    if CACHE_BACKEND == "disk":
+        return _DiskStore()
+    if CACHE_BACKEND == "none":
+        return None
+    raise ValueError(f"Unknown CACHE_BACKEND: {CACHE_BACKEND}")
+
+
+class Cache:
+    """A namespaced TTL cache with an in-memory LRU in front of the persistent tier."""
+
+    def __init__(self, namespace: str, ttl: float, maxsize: int = 1024, persistent: bool = True):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._memory = OrderedDict()  # key -> (value, stored_at, expires_at)
+        self._store = _persistent_store() if persistent else None
+        self._inflight = {}  # key -> asyncio.Task
+
+    def _remember(self, key: str, value, stored_at: float, expires_at: float):
+        self._memory[key] = (value, stored_at, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def _memory_entry(self, key: str):
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[2] > time.time():
+                self._memory.move_to_end(key)
+                return entry
+            del self._memory[key]
+        return None
+
+    async def _get_entry(self, key: str):
+        """Return (value, stored_at, expires_at) for a live entry, or None."""
+        entry = self._memory_entry(key)
+        if entry is not None:
+            return entry
+
+        if self._store is None:
+            return None
+        try:
+            entry = await self._store.get(self.namespace, key)
+        except Exception as e:
+            print(f"Cache read failed ({self.namespace}): {e}")
+            return None
+        if entry is None:
+            return None
+        self._remember(key, *entry)
+        return entry
+
+    async def get(self, key: str):
+        """Return the cached value, or None on a miss."""
+        entry = await self._get_entry(key)
+        return entry[0] if entry is not None else None
+
+    async def get_many(self, keys: list[str]) -> dict:
+        """Return {key: value} for the keys that are cached; misses are left out."""
+        found = {}
+        for key in keys:
+            entry = self._memory_entry(key)
+            if entry is not None:
+                found[key] = entry[0]
+
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if self._store is None or not missing:
+            return found
+        try:
+            entries = await self._store.get_many(self.namespace, missing)
+        except Exception as e:
+            print(f"Cache read failed ({self.namespace}): {e}")
+            return found
+        for key, entry in entries.items():
+            self._remember(key, *entry)
+            found[key] = entry[0]
+        return found
+
+    async def set(self, key: str, value, ttl: float = None):
+        await self.set_many({key: value}, ttl)
+
+    async def set_many(self, items: dict, ttl: float = None):
+        """Store every {key: value} in `items`."""
+        if not items:
+            return
+        stored_at = time.time()
+        expires_at = stored_at + (ttl if ttl is not None else self.ttl)
+        for key, value in items.items():
+            self._remember(key, value, stored_at, expires_at)
+        if self._store is not None:
+            try:
+                await self._store.set_many(
+                    self.namespace, [(key, value, stored_at, expires_at) for key, value in items.items()]
+                )
+            except Exception as e:
+                print(f"Cache write failed ({self.namespace}): {e}")
+
+    async def delete(self, key: str):
+        self._memory.pop(key, None)
+        if self._store is not None:
+            await self._store.delete(self.namespace, key)
+
+    def _load(self, key: str, fetch, should_cache):
+        """Start (or join) the single in-flight fetch for `key`."""
+        task = self._inflight.get(key)
+        if task is None:
+            async def load():
+                try:
+                    result = await fetch()
+                    if should_cache is None or should_cache(result):
+                        await self.set(key, result)
+                    return result
+                finally:
+                    self._inflight.pop(key, None)
+
+            task = asyncio.ensure_future(load())
+            self._inflight[key] = task
+        return task
+
+    async def get_or_fetch(self, key: str, fetch, should_cache=None, refresh_after: float = None):
+        """
+        Return the cached value for `key`, calling `fetch()` on a miss.
+        Concurrent misses for the same key share a single `fetch()` call.
+        Results for which `should_cache(value)` is false are returned but not stored.
+
+        With `refresh_after`, entries older than that many seconds are still
+        served immediately, and a background fetch replaces them.
+        """
+        entry = await self._get_entry(key)
+        if entry is not None:
+            value, stored_at, _ = entry
+            if refresh_after is not None and time.time() - stored_at > refresh_after:
+                # Refreshes yield to interactive calls at the rate limiter
+                with priority(BACKGROUND):
+                    task = self._load(key, fetch, should_cache)
+                # A failed background refresh just leaves the stale entry in place
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            return value
+
+        # Shield so one caller giving up doesn't cancel the fetch for the others
+        return await asyncio.shield(self._load(key, fetch, should_cache))
@@ -0,0 +1,81 @@
+"""
+Checkpoint storage for analysis runs.
+
+With checkpointing on, LangGraph saves the graph state after every step,
+keyed by the chat thread, so an analysis interrupted by a crash, deploy or
+deadline continues from its last completed step instead of starting over
+and paying for every LLM call again. ANALYSIS_CHECKPOINT_BACKEND selects
+where checkpoints live:
+
+- postgres (default): the tables created by langgraph-checkpoint-postgres
+- sqlite: a local file at ANALYSIS_CHECKPOINT_PATH, for development
+- none: no checkpoints; an interrupted analysis has to be re-run
+"""
+
+import asyncio
+import os
+
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from app.services.database import POOL_MAX_SIZE
+
+CHECKPOINT_BACKEND = os.getenv("ANALYSIS_CHECKPOINT_BACKEND", "postgres")
+CHECKPOINT_PATH = os.getenv("ANALYSIS_CHECKPOINT_PATH", "checkpoints.sqlite")
+
+_saver = None
+_connection = None  # pool or sqlite connection behind the saver
+_lock = asyncio.Lock()
+
+
+def checkpoint_config(thread_id: int) -> dict:
+    """Graph config that ties a run's checkpoints to its chat thread."""
+    return {"configurable": {"thread_id": f"analysis:{thread_id}"}}
+
+
+async def _open_saver():
+    if CHECKPOINT_BACKEND == "postgres":
+        from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+
+        # The saver expects autocommit connections without prepared statements,
+        # so it gets its own pool rather than sharing database.py's
+        pool = AsyncConnectionPool(
+            os.getenv("DATABASE_URL"),
+            min_size=1,
+            max_size=POOL_MAX_SIZE,
+            kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+            open=False
+        )
+        await pool.open()
+        return AsyncPostgresSaver(pool), pool
+    if CHECKPOINT_BACKEND == "sqlite":
+        import aiosqlite
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+        conn = await aiosqlite.connect(CHECKPOINT_PATH)
+        return AsyncSqliteSaver(conn), conn
+    raise ValueError(f"Unknown ANALYSIS_CHECKPOINT_BACKEND: {CHECKPOINT_BACKEND}")
+
+
+async def get_checkpointer():
+    """Return the process-wide checkpointer, or None when checkpointing is off."""
+    global _saver, _connection
+    if CHECKPOINT_BACKEND == "none":
+        return None
+    if _saver is None:
+        async with _lock:
+            if _saver is None:
+                saver, connection = await _open_saver()
+                await saver.setup()
+                _connection = connection
+                _saver = saver
+    return _saver
+
+
+async def close():
+    """Release the checkpointer's connections (called on app shutdown)."""
+    global _saver, _connection
+    if _connection is not None:
+        await _connection.close()
+    _saver = None
+    _connection = None
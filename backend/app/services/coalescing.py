@@ -0,0 +1,152 @@
+"""
+Coalescing of identical analyses.
+
+Double-clicks, reloads and re-submits start the same analysis (same posting,
+resume version and profile) several times. Each run registers under a key
+over those inputs; an identical request that arrives while it is running,
+or within ANALYSIS_COALESCE_TTL after it completed, mirrors that run's
+messages into its own thread instead of calling Exa and OpenAI again.
+
+Completed runs are found through the cache backend, so any process can
+replay them. Running ones can only be attached to from another process when
+MESSAGE_EVENTS_BACKEND=postgres carries their events across processes.
+"""
+
+from collections import Counter
+import asyncio
+import json
+import os
+
+from app.services import events
+from app.services.cache import Cache, hash_key
+from app.services.database import MessageWriter, fetch_thread, fetch_messages
+from app.services.exa_client import normalize_url
+
+COALESCING_ENABLED = os.getenv("ANALYSIS_COALESCING", "on") == "on"
+COALESCE_TTL = float(os.getenv("ANALYSIS_COALESCE_TTL", "3600"))
+
+# Profile fields that change what an analysis produces; the resume enters
+# the key through its preprocessed hash instead of the raw text
+PROFILE_FIELDS = ["school", "graduationYear", "major", "linkedinUrl", "targetRoles", "clubs", "activities", "extraInfo"]
+
+# Completed runs: key -> source thread id
+completed_runs = Cache("analysis_completed", ttl=COALESCE_TTL)
+
+# Running runs: key -> source thread id. Only shared across processes when
+# their events are, since attaching means following the source's events.
+running_runs = Cache("analysis_running", ttl=3600, persistent=events.EVENTS_BACKEND == "postgres")
+
+
+def analysis_key(job_url: str, resume_hash: str, user_profile: dict) -> str:
+    """Identity of an analysis: posting, resume version and profile."""
+    profile = {field: (user_profile or {}).get(field) for field in PROFILE_FIELDS}
+    return hash_key(normalize_url(job_url), resume_hash, json.dumps(profile, sort_keys=True, default=str))
+
+
+# Runs started in this process: key -> thread id. Claimed without awaiting,
+# so simultaneous identical requests can't both miss each other.
+_local_runs = {}
+
+
+async def claim_run(key: str, thread_id: int, ttl: float):
+    """
+    Return the thread id of an identical run that is in progress or recently
+    completed, or None after registering `thread_id` as running `key` for at
+    most `ttl` seconds.
+    """
+    source = _local_runs.get(key)
+    if source is not None and source != thread_id:
+        return source
+    _local_runs[key] = thread_id
+
+    source = await running_runs.get(key)
+    if source is None:
+        source = await completed_runs.get(key)
+    if source is not None and source != thread_id:
+        del _local_runs[key]
+        return source
+
+    await running_runs.set(key, thread_id, ttl)
+    return None
+
+
+async def finish_run(key: str, thread_id: int, status: str = None):
+    """Unregister a run; completed ones stay available for replay."""
+    if _local_runs.get(key) == thread_id:
+        del _local_runs[key]
+    try:
+        await running_runs.delete(key)
+    except Exception as e:
+        print(f"Failed to unregister analysis run: {e}")
+    if status == "complete" and COALESCE_TTL > 0:
+        await completed_runs.set(key, thread_id)
+
+
+def _final(status: str):
+    """`status` if the run has ended, else None (the mirror stays "analyzing")."""
+    return status if status in events.FINAL_STATUSES else None
+
+
+def _signature(row: dict):
+    return row["role"], row["content"], row["message_type"]
+
+
+def _copy(writer: MessageWriter, message: dict):
+    writer.add_message(message["role"], message["content"], message["messageType"], message["metadata"])
+
+
+async def replay_run(source: int, thread_id: int, timeout: float):
+    """
+    Mirror the messages of thread `source` into `thread_id`, following it
+    until it reaches a final status. Returns that status, or None if the
+    source doesn't exist or didn't finish within `timeout` seconds.
+    """
+    # Subscribe before reading the backlog so nothing written in between is missed
+    queue = await events.subscribe(source)
+    try:
+        thread = await fetch_thread(source)
+        if thread is None:
+            return None
+
+        status = thread["status"]
+        last_id = 0
+        copies = {}  # source message id -> id of its copy, for streamed updates
+        # Messages both threads got before their pipelines started (the
+        # starter the frontend inserts) are already here; don't copy them
+        existing = Counter(_signature(row) for row in await fetch_messages(thread_id))
+        async with MessageWriter(thread_id) as writer:
+            copied = []
+            for row in await fetch_messages(source):
+                last_id = row["id"]
+                if existing[_signature(row)] > 0:
+                    existing[_signature(row)] -= 1
+                    continue
+                copied.append(row["id"])
+                _copy(writer, events.message_event(row))
+            writer.update_thread(thread["company"], thread["role"], _final(status))
+        copies.update(zip(copied, (m["id"] for m in writer.written)))
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while status not in events.FINAL_STATUSES:
+            try:
+                event = await asyncio.wait_for(queue.get(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                return None
+
+            async with MessageWriter(thread_id) as writer:
+                if event["type"] == "message":
+                    if event["data"]["id"] > last_id:
+                        last_id = event["data"]["id"]
+                        _copy(writer, event["data"])
+                elif event["type"] == "message_update":
+                    if event["data"]["id"] in copies:
+                        writer.update_message(copies[event["data"]["id"]], event["data"]["content"], event["data"]["metadata"])
+                else:
+                    status = event["data"].get("status") or status
+                    writer.update_thread(event["data"].get("company"), event["data"].get("role"), _final(status))
+            if event["type"] == "message" and writer.written:
+                copies[event["data"]["id"]] = writer.written[0]["id"]
+        return status
+    finally:
+        events.unsubscribe(source, queue)
@@ -1,56 +1,329 @@
-import psycopg2
-import os
-import json
+"""
+Database access.
+
+Connections come from process-wide pools (a sync one for worker/queue code
+and an async one for the graph) instead of a fresh handshake per write.
+Graph nodes collect their writes in a `MessageWriter` and flush them in a
+single transaction, which also publishes them to live subscribers.
+"""
+
+from contextlib import contextmanager, asynccontextmanager
 from datetime import datetime
+import asyncio
+import os
+
+from psycopg.rows import dict_row
+from psycopg.types.json import Jsonb
+from psycopg_pool import ConnectionPool, AsyncConnectionPool
+
+from app.services import events
+
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+
+# Steps of an analysis whose messages have been written, so a resumed run
+# that re-executes a step doesn't post its messages twice. Runs are only
+# resumed when checkpointing is on (see checkpoints.py), so otherwise steps
+# aren't recorded at all
+STEP_CLAIMS = os.getenv("ANALYSIS_CHECKPOINT_BACKEND", "postgres") != "none"
+
+STEPS_SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS analysis_steps (
+        thread_id INTEGER NOT NULL,
+        step TEXT NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (thread_id, step)
+    )
+"""
+
+_pool = None
+_async_pool = None
+_async_pool_lock = asyncio.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Return the shared sync connection pool, opening it on first use."""
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool(
+            os.getenv("DATABASE_URL"),
+            min_size=POOL_MIN_SIZE,
+            max_size=POOL_MAX_SIZE,
+            open=True
+        )
+    return _pool
+
+
+async def get_async_pool() -> AsyncConnectionPool:
+    """Return the shared async connection pool, opening it on first use."""
+    global _async_pool
+    if _async_pool is None:
+        async with _async_pool_lock:
+            if _async_pool is None:
+                pool = AsyncConnectionPool(
+                    os.getenv("DATABASE_URL"),
+                    min_size=POOL_MIN_SIZE,
+                    max_size=POOL_MAX_SIZE,
+                    open=False
+                )
+                await pool.open()
+                _async_pool = pool
+    return _async_pool
+
+
+@contextmanager
+def connection():
+    """Borrow a pooled connection. Commits on success, rolls back on error."""
+    with get_pool().connection() as conn:
+        yield conn
+
+
+def ensure_schema():
+    """Create the bookkeeping tables used by `MessageWriter` (run at startup)."""
+    if STEP_CLAIMS:
+        with connection() as conn:
+            conn.execute(STEPS_SCHEMA_SQL)
+
+
+@asynccontextmanager
+async def aconnection():
+    """Async variant of `connection`."""
+    pool = await get_async_pool()
+    async with pool.connection() as conn:
+        yield conn
+
+
+async def close_pools():
+    """Close both pools (called on app shutdown)."""
+    global _pool, _async_pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+
+
+MESSAGE_COLUMNS = "id, role, content, message_type, metadata, created_at"
+
+INSERT_MESSAGE_SQL = f"""
+    INSERT INTO messages (thread_id, role, content, message_type, metadata, created_at)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    RETURNING {MESSAGE_COLUMNS}
+"""
+
+
+UPDATE_MESSAGE_SQL = f"""
+    UPDATE messages SET content = %s, metadata = %s
+    WHERE id = %s
+    RETURNING {MESSAGE_COLUMNS}
+"""
+
+
+def _message_row(thread_id: int, role: str, content: str, message_type: str, metadata: dict):
+    return (thread_id, role, content, message_type, Jsonb(metadata) if metadata else None, datetime.now())
+
+
+def _thread_update(thread_id: int, fields: dict):
+    """Build the UPDATE statement for the non-empty thread fields."""
+    updates = [f"{column} = %s" for column in fields]
+    values = list(fields.values())
+
+    updates.append("updated_at = %s")
+    values.append(datetime.now())
+    values.append(thread_id)
 
-def get_db_connection():
-    """Get database connection."""
-    return psycopg2.connect(os.getenv("DATABASE_URL"))
+    return f"UPDATE threads SET {', '.join(updates)} WHERE id = %s RETURNING id, company, role, status", values
 
-def add_message(thread_id: int, role: str, content: str, message_type: str = "text", metadata: dict = None):
+
+def _thread_fields(company: str = None, role: str = None, status: str = None) -> dict:
+    return {
+        column: value
+        for column, value in (("company", company), ("role", role), ("status", status))
+        if value
+    }
+
+
+async def aadd_message(thread_id: int, role: str, content: str, message_type: str = "text", metadata: dict = None, step: str = None):
     """Add a message to a thread."""
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO messages (thread_id, role, content, message_type, metadata, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                """,
-                (thread_id, role, content, message_type, json.dumps(metadata) if metadata else None, datetime.now())
-            )
-            conn.commit()
-    finally:
-        conn.close()
+    async with MessageWriter(thread_id, step) as writer:
+        writer.add_message(role, content, message_type, metadata)
+
 
-def update_thread(thread_id: int, company: str = None, role: str = None, status: str = None):
+async def aupdate_thread(thread_id: int, company: str = None, role: str = None, status: str = None):
     """Update thread information."""
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            updates = []
-            values = []
-            
-            if company:
-                updates.append("company = %s")
-                values.append(company)
-            if role:
-                updates.append("role = %s")
-                values.append(role)
-            if status:
-                updates.append("status = %s")
-                values.append(status)
-            
-            updates.append("updated_at = %s")
-            values.append(datetime.now())
-            values.append(thread_id)
-            
-            if updates:
-                cur.execute(
-                    f"UPDATE threads SET {', '.join(updates)} WHERE id = %s",
-                    values
+    async with MessageWriter(thread_id) as writer:
+        writer.update_thread(company, role, status)
+
+
+async def fetch_thread(thread_id: int):
+    """Return the thread's id, company, role and status, or None."""
+    async with aconnection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute("SELECT id, company, role, status FROM threads WHERE id = %s", (thread_id,))
+            return await cur.fetchone()
+
+
+async def fetch_messages(thread_id: int, after_id: int = 0) -> list[dict]:
+    """Return a thread's messages with id greater than `after_id`, oldest first."""
+    async with aconnection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE thread_id = %s AND id > %s ORDER BY id",
+                (thread_id, after_id)
+            )
+            return await cur.fetchall()
+
+
+async def fetch_message(message_id: int):
+    """Return a single message row, or None."""
+    async with aconnection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE id = %s", (message_id,))
+            return await cur.fetchone()
+
+
+class MessageWriter:
+    """
+    Collects the messages and thread updates produced by one step of a run
+    and writes them in a single transaction. Thread updates are coalesced
+    (later values win) and the writes are sent as one pipeline, so a flush is
+    one pooled connection checkout and one round trip for the writes, plus
+    one to claim the step (if any) and one to notify other processes.
+    Everything written is published to thread subscribers (see events.py).
+
+        async with MessageWriter(thread_id) as writer:
+            writer.update_thread(company="Acme")
+            writer.add_message("assistant", "...", "job_info", {...})
+
+    With `step`, the messages are written at most once per thread and step:
+    if a resumed run repeats a step that already posted, they are dropped.
+    """
+
+    def __init__(self, thread_id: int, step: str = None):
+        self.thread_id = thread_id
+        self.step = step if STEP_CLAIMS else None
+        self._rows = []
+        self._updates = []
+        self._thread_fields = {}
+        # Messages inserted by flushes so far, as sent to subscribers
+        self.written = []
+
+    def add_message(self, role: str, content: str, message_type: str = "text", metadata: dict = None):
+        self._rows.append(_message_row(self.thread_id, role, content, message_type, metadata))
+
+    def update_message(self, message_id: int, content: str, metadata: dict = None):
+        """Replace the content and metadata of a message written earlier."""
+        self._updates.append((content, Jsonb(metadata) if metadata else None, message_id))
+
+    def update_thread(self, company: str = None, role: str = None, status: str = None):
+        self._thread_fields.update(_thread_fields(company, role, status))
+
+    async def _claim_step(self, cur) -> bool:
+        """Record this writer's step; False if it was already recorded."""
+        await cur.execute(
+            "INSERT INTO analysis_steps (thread_id, step) VALUES (%s, %s) ON CONFLICT DO NOTHING RETURNING step",
+            (self.thread_id, self.step)
+        )
+        return await cur.fetchone() is not None
+
+    async def flush(self):
+        """Write everything collected so far."""
+        if not self._rows and not self._updates and not self._thread_fields:
+            return
+        rows, updates, fields = self._rows, self._updates, self._thread_fields
+        self._rows, self._updates, self._thread_fields = [], [], {}
+
+        event_list = []
+        async with aconnection() as conn, conn.pipeline() as pipeline:
+            # The inserts depend on the claim, so it is the one statement
+            # waited on before the rest are sent
+            if rows and self.step and not await self._claim_step(conn.cursor()):
+                rows = []
+
+            # One cursor per statement, so every result is still there after
+            # the single sync below
+            inserted = thread_cur = None
+            if rows:
+                inserted = conn.cursor(row_factory=dict_row)
+                await inserted.executemany(INSERT_MESSAGE_SQL, rows, returning=True)
+            updated = []
+            for update in updates:
+                cur = conn.cursor(row_factory=dict_row)
+                await cur.execute(UPDATE_MESSAGE_SQL, update)
+                updated.append(cur)
+            if fields:
+                thread_cur = conn.cursor(row_factory=dict_row)
+                await thread_cur.execute(*_thread_update(self.thread_id, fields))
+            await pipeline.sync()
+
+            if inserted:
+                while True:
+                    event_list.append({"type": "message", "data": events.message_event(await inserted.fetchone())})
+                    if not inserted.nextset():
+                        break
+            for cur in updated:
+                row = await cur.fetchone()
+                if row:
+                    event_list.append({"type": "message_update", "data": events.message_event(row)})
+            if thread_cur:
+                thread = await thread_cur.fetchone()
+                if thread:
+                    event_list.append({"type": "thread", "data": thread})
+
+            if events.EVENTS_BACKEND == "postgres" and event_list:
+                # Delivered to every listening process when the transaction commits
+                payloads = [p for event in event_list for p in events.notify_payloads(self.thread_id, event)]
+                await conn.execute(
+                    "SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload",
+                    (events.CHANNEL, payloads)
                 )
-                conn.commit()
-    finally:
-        conn.close()
 
+        # Later flushes belong to the same, now recorded, step
+        if rows:
+            self.step = None
+        self.written.extend(e["data"] for e in event_list if e["type"] == "message")
+
+        if events.EVENTS_BACKEND != "postgres":
+            for event in event_list:
+                events.publish(self.thread_id, event)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        # Writes from a step that raised are dropped along with the step
+        if exc_type is None:
+            await self.flush()
+
+
+class StreamingMessage:
+    """
+    A message that is posted once and then rewritten in place as its content
+    streams in. The first `update` inserts the row (subject to the step
+    check, see `MessageWriter`); later ones update it and are published as
+    `message_update` events.
+    """
+
+    def __init__(self, thread_id: int, role: str, message_type: str, step: str = None):
+        self.thread_id = thread_id
+        self.role = role
+        self.message_type = message_type
+        self.step = step
+        self.message_id = None
+        self._skipped = False
+
+    async def update(self, content: str, metadata: dict = None):
+        if self._skipped:
+            return
+        async with MessageWriter(self.thread_id, self.step if self.message_id is None else None) as writer:
+            if self.message_id is None:
+                writer.add_message(self.role, content, self.message_type, metadata)
+            else:
+                writer.update_message(self.message_id, content, metadata)
+        if self.message_id is None:
+            if not writer.written:
+                # A resumed run already posted this step's message
+                self._skipped = True
+                return
+            self.message_id = writer.written[0]["id"]
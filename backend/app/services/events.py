@@ -0,0 +1,141 @@
+"""
+Pub/sub for thread updates.
+
+`MessageWriter` publishes every message and thread update it commits, and
+the SSE endpoint in app/routers/threads.py subscribes per thread. Delivery
+is selected with MESSAGE_EVENTS_BACKEND:
+
+- local: events are handed straight to subscribers in this process. Use it
+  when analyses run in the API process (background mode or the local queue).
+- postgres: events go through NOTIFY on the `thread_events` channel inside
+  the writing transaction, and each API process LISTENs once and fans them
+  out to its own subscribers. Use it when separate workers run analyses.
+  `subscribe` returns once LISTEN is active. Notifications sent while the
+  listener was reconnecting are lost, so after a reconnect every subscriber
+  gets a `resync` event and should re-read the thread.
+"""
+
+from collections import defaultdict
+import asyncio
+import json
+import os
+
+import psycopg
+
+CHANNEL = "thread_events"
+
+# Thread statuses after which no more events are written
+FINAL_STATUSES = {"complete", "error"}
+EVENTS_BACKEND = os.getenv("MESSAGE_EVENTS_BACKEND", "local")
+
+# NOTIFY payloads must stay under 8000 bytes; larger messages are sent by id
+# and read back by the listening process.
+MAX_NOTIFY_PAYLOAD = 7500
+
+# Seconds `subscribe` waits for the LISTEN connection before giving up
+LISTEN_TIMEOUT = float(os.getenv("MESSAGE_EVENTS_LISTEN_TIMEOUT", "10"))
+
+_subscribers = defaultdict(set)  # thread_id -> set of asyncio.Queue
+_listener = None
+_listening = asyncio.Event()
+
+
+def message_event(row: dict) -> dict:
+    """Shape a messages row the way the frontend's Message type expects."""
+    created_at = row.get("created_at")
+    return {
+        "id": row["id"],
+        "role": row["role"],
+        "content": row["content"],
+        "messageType": row.get("message_type"),
+        "metadata": row.get("metadata"),
+        "createdAt": created_at.isoformat() if hasattr(created_at, "isoformat") else created_at,
+    }
+
+
+def publish(thread_id: int, event: dict):
+    """Deliver an event to this process's subscribers for `thread_id`."""
+    for queue in list(_subscribers.get(thread_id, ())):
+        queue.put_nowait(event)
+
+
+def notify_payloads(thread_id: int, event: dict) -> list[str]:
+    """Encode an event for NOTIFY, falling back to a reference for big messages."""
+    payload = json.dumps({"threadId": thread_id, **event}, default=str)
+    if len(payload.encode()) <= MAX_NOTIFY_PAYLOAD:
+        return [payload]
+    return [json.dumps({"threadId": thread_id, "type": event["type"], "ref": event["data"]["id"]})]
+
+
+async def subscribe(thread_id: int) -> asyncio.Queue:
+    """
+    Register a subscriber queue for a thread's events. With the postgres
+    backend, raises TimeoutError if the listener can't connect in time.
+    """
+    if EVENTS_BACKEND == "postgres":
+        await _ensure_listener()
+    queue = asyncio.Queue()
+    _subscribers[thread_id].add(queue)
+    return queue
+
+
+def unsubscribe(thread_id: int, queue: asyncio.Queue):
+    subscribers = _subscribers.get(thread_id)
+    if subscribers is not None:
+        subscribers.discard(queue)
+        if not subscribers:
+            del _subscribers[thread_id]
+
+
+async def _ensure_listener():
+    """Start the LISTEN task if needed and wait until it is listening."""
+    global _listener
+    if _listener is None or _listener.done():
+        _listener = asyncio.create_task(_listen())
+    await asyncio.wait_for(_listening.wait(), timeout=LISTEN_TIMEOUT)
+
+
+async def _listen():
+    """Hold one LISTEN connection per process and fan notifications out locally."""
+    from app.services.database import fetch_message
+
+    reconnecting = False
+    while True:
+        try:
+            conn = await psycopg.AsyncConnection.connect(os.getenv("DATABASE_URL"), autocommit=True)
+            async with conn:
+                await conn.execute(f"LISTEN {CHANNEL}")
+                _listening.set()
+                if reconnecting:
+                    # Anything notified while disconnected was dropped
+                    for thread_id in list(_subscribers):
+                        publish(thread_id, {"type": "resync"})
+                    reconnecting = False
+                async for notify in conn.notifies():
+                    event = json.loads(notify.payload)
+                    thread_id = event.pop("threadId")
+                    if thread_id not in _subscribers:
+                        continue
+                    if "ref" in event:
+                        row = await fetch_message(event.pop("ref"))
+                        if row is None:
+                            continue
+                        event["data"] = message_event(row)
+                    publish(thread_id, event)
+        except asyncio.CancelledError:
+            _listening.clear()
+            raise
+        except Exception as e:
+            _listening.clear()
+            reconnecting = True
+            print(f"Event listener error, reconnecting: {e}")
+            await asyncio.sleep(1)
+
+
+async def close():
+    """Stop the LISTEN task (called on app shutdown)."""
+    global _listener, _listening
+    if _listener is not None:
+        _listener.cancel()
+        _listener = None
+    _listening = asyncio.Event()
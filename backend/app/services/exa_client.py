@@ -1,61 +1,248 @@
-from exa_py import Exa
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import asyncio
+import httpx
 import os
+import re
+
+from app.services.cache import Cache, hash_key
+from app.services.rate_limit import get_limiter
+from app.services.resilience import resilient_call
+
+EXA_BASE_URL = "https://api.exa.ai"
+EXA_TIMEOUT = float(os.getenv("EXA_TIMEOUT", "20"))
+
+# Query parameters that only track where a click came from. Generic names
+# such as "ref" or "source" are kept: some job boards route postings by them
+TRACKING_PARAMS = {
+    "gclid", "fbclid", "msclkid", "igshid", "mc_cid", "mc_eid", "_hsenc", "_hsmi",
+    "trk", "trackingid", "lipi", "gh_src",
+}
+TRACKING_PARAM_PREFIXES = ("utm_", "lever-")
+HOST_PREFIXES = ("www.", "m.")
+ORG_SUFFIXES = {"inc", "llc", "ltd", "corp", "corporation", "co", "company", "plc", "gmbh", "the"}
+
+# Most URLs sent in one multi-URL /contents request
+EXA_CONTENTS_BATCH = int(os.getenv("EXA_CONTENTS_BATCH", "25"))
+
+# Scraped postings keyed by normalized URL
+scrape_cache = Cache(
+    "scrape",
+    ttl=float(os.getenv("SCRAPE_CACHE_TTL", "86400")),
+    maxsize=int(os.getenv("SCRAPE_CACHE_MAXSIZE", "512"))
+)
+
+# Alumni contacts keyed by normalized (company, school). Entries are refreshed
+# in the background after ALUMNI_REFRESH_AFTER and dropped after the TTL.
+ALUMNI_REFRESH_AFTER = float(os.getenv("ALUMNI_REFRESH_AFTER", str(7 * 86400)))
+alumni_index = Cache(
+    "alumni",
+    ttl=float(os.getenv("ALUMNI_INDEX_TTL", str(30 * 86400))),
+    maxsize=int(os.getenv("ALUMNI_INDEX_MAXSIZE", "2048"))
+)
+
+# Shared async HTTP client for Exa. Requests reuse pooled keep-alive
+# connections instead of a blocking SDK call per request. Built on first use.
+http_client = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """The process-wide Exa client, created on first call."""
+    global http_client
+    if http_client is None:
+        http_client = httpx.AsyncClient(
+            base_url=EXA_BASE_URL,
+            headers={"x-api-key": os.getenv("EXA_API_KEY") or ""},
+            timeout=httpx.Timeout(30.0, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("EXA_MAX_CONNECTIONS", "100")),
+                max_keepalive_connections=int(os.getenv("EXA_MAX_KEEPALIVE", "20")),
+            ),
+        )
+    return http_client
+
+async def _post(path: str, payload: dict) -> dict:
+    """POST a JSON payload to the Exa API and return the decoded body."""
+    async def attempt():
+        response = await get_http_client().post(path, json=payload)
+        response.raise_for_status()
+        return response.json()
+    
+    return await resilient_call("exa", attempt, EXA_TIMEOUT, limit=get_limiter("exa").limit)
+
+def normalize_url(url: str) -> str:
+    """
+    Canonicalize a posting URL so the same page shared with different
+    tracking parameters, host aliases or anchors maps to one key. Route-like
+    fragments ("#/jobs/123", "#!/jobs/123") select the posting on hash-routed
+    boards, so they are kept.
+    """
+    url = url.strip()
+    parts = urlsplit(url)
+    if not parts.netloc:
+        # Pasted without a scheme, e.g. "boards.greenhouse.io/acme/jobs/1"
+        parts = urlsplit(f"https://{url}")
+    host = (parts.hostname or "").lower()
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(TRACKING_PARAM_PREFIXES) and k.lower() not in TRACKING_PARAMS
+    )
+    path = parts.path.rstrip("/") or "/"
+    fragment = parts.fragment if parts.fragment.startswith(("/", "!")) else ""
+    return urlunsplit(("https", host, path, urlencode(query), fragment))
 
-exa = Exa(api_key=os.getenv("EXA_API_KEY"))
 
 async def scrape_job_posting(job_url: str) -> dict:
     """
     Use Exa to scrape and extract job posting content.
+    Results are cached by normalized URL; concurrent requests for the same
+    posting share one Exa call.
     """
-    try:
-        result = exa.get_contents(
-            [job_url],
-            text=True
-        )
+    async def fetch():
+        result = await _post("/contents", {"ids": [job_url], "text": True})
+        results = result.get("results") or []
         
-        if result.results and len(result.results) > 0:
-            content = result.results[0]
+        if results:
+            content = results[0]
             return {
                 "url": job_url,
-                "title": content.title or "Unknown Title",
-                "text": content.text or "",
+                "title": content.get("title") or "Unknown Title",
+                "text": content.get("text") or "",
             }
         
         return {"url": job_url, "title": "Unknown", "text": ""}
+    
+    try:
+        return await scrape_cache.get_or_fetch(
+            hash_key(normalize_url(job_url)),
+            fetch,
+            should_cache=lambda posting: bool(posting["text"])
+        )
     except Exception as e:
+        # Let the pipeline report the failure instead of analyzing the error text
         print(f"Error scraping job: {e}")
-        return {"url": job_url, "title": "Error", "text": str(e)}
+        raise
+
+async def _fetch_postings(job_urls: list[str]) -> dict:
+    """Fetch postings in one /contents request, keyed by normalized URL."""
+    result = await _post("/contents", {"ids": job_urls, "text": True})
+    postings = {}
+    for content in result.get("results") or []:
+        # Exa echoes the requested URL as the id; `url` may be the resolved one
+        requested = content.get("id") or content.get("url") or ""
+        postings[normalize_url(requested)] = {
+            "url": requested,
+            "title": content.get("title") or "Unknown Title",
+            "text": content.get("text") or "",
+        }
+    return postings
+
+async def scrape_job_postings(job_urls: list[str]) -> dict:
+    """
+    Scrape many postings at once, keyed by normalized URL. Duplicates are
+    collapsed, cached postings are served from the cache and the rest are
+    fetched EXA_CONTENTS_BATCH at a time in multi-URL requests. Postings that
+    couldn't be read come back with empty text.
+    """
+    urls = {}
+    for url in job_urls:
+        urls.setdefault(normalize_url(url), url)
+    
+    cache_keys = {hash_key(key): key for key in urls}
+    cached = await scrape_cache.get_many(list(cache_keys))
+    postings = {cache_keys[cache_key]: posting for cache_key, posting in cached.items()}
+    missing = [url for key, url in urls.items() if key not in postings]
+    
+    chunks = [missing[i:i + EXA_CONTENTS_BATCH] for i in range(0, len(missing), EXA_CONTENTS_BATCH)]
+    fetched = await asyncio.gather(*[_fetch_postings(chunk) for chunk in chunks], return_exceptions=True)
+    new = {}
+    for chunk, result in zip(chunks, fetched):
+        if isinstance(result, Exception):
+            print(f"Error scraping {len(chunk)} jobs: {result}")
+            continue
+        new.update({key: posting for key, posting in result.items() if key in urls and posting["text"]})
+    await scrape_cache.set_many({hash_key(key): posting for key, posting in new.items()})
+    postings.update(new)
+    
+    for key, url in urls.items():
+        postings.setdefault(key, {"url": url, "title": "Unknown", "text": ""})
+    return postings
+
+def normalize_org(name: str) -> str:
+    """Fold case, punctuation and corporate suffixes so "Google LLC" and "google" share a key."""
+    words = re.sub(r"[^a-z0-9&]+", " ", (name or "").lower()).split()
+    while words and words[-1] in ORG_SUFFIXES:
+        words.pop()
+    return " ".join(words)
+
+def _profile_key(url: str) -> str:
+    """Canonical LinkedIn profile URL, used to de-duplicate contacts."""
+    parts = urlsplit((url or "").strip())
+    host = (parts.hostname or "").lower()
+    if host.endswith("linkedin.com"):
+        host = "linkedin.com"
+    return f"{host}{parts.path.rstrip('/').lower()}"
+
+async def _search_alumni(company: str, school: str) -> list[dict]:
+    query = f"{school} alumni at {company} site:linkedin.com/in"
+    
+    result = await _post("/search", {
+        "query": query,
+        "numResults": 5,
+        "type": "neural",
+        "useAutoprompt": True,
+    })
+    
+    contacts = []
+    seen = set()
+    for r in result.get("results") or []:
+        # The same person often comes back under several URL variants
+        profile = _profile_key(r.get("url"))
+        if profile in seen:
+            continue
+        seen.add(profile)
+        
+        # Extract name from title (usually "Name - Title | LinkedIn")
+        title = r.get("title")
+        title_parts = title.split(" - ") if title else ["Unknown"]
+        name = title_parts[0].strip()
+        role = title_parts[1].split("|")[0].strip() if len(title_parts) > 1 else "Unknown"
+        
+        contacts.append({
+            "name": name,
+            "title": role,
+            "url": r.get("url"),
+            "connection": f"{school} Alumni"
+        })
+    
+    return contacts
 
 async def search_linkedin_alumni(company: str, school: str) -> list[dict]:
     """
     Use Exa to find LinkedIn profiles of alumni at a company.
+    Served from the contact index keyed by normalized (company, school);
+    entries older than ALUMNI_REFRESH_AFTER are returned immediately and
+    refreshed in the background, so only cold pairs wait on Exa.
     """
     try:
-        query = f"{school} alumni at {company} site:linkedin.com/in"
-        
-        result = exa.search(
-            query,
-            num_results=5,
-            type="neural",
-            use_autoprompt=True
+        return await alumni_index.get_or_fetch(
+            hash_key(normalize_org(company), normalize_org(school)),
+            lambda: _search_alumni(company, school),
+            should_cache=bool,
+            refresh_after=ALUMNI_REFRESH_AFTER
         )
-        
-        contacts = []
-        for r in result.results:
-            # Extract name from title (usually "Name - Title | LinkedIn")
-            title_parts = r.title.split(" - ") if r.title else ["Unknown"]
-            name = title_parts[0].strip()
-            role = title_parts[1].split("|")[0].strip() if len(title_parts) > 1 else "Unknown"
-            
-            contacts.append({
-                "name": name,
-                "title": role,
-                "url": r.url,
-                "connection": f"{school} Alumni"
-            })
-        
-        return contacts
     except Exception as e:
         print(f"Error searching LinkedIn: {e}")
         return []
 
+async def aclose():
+    """Close pooled Exa connections (called on app shutdown)."""
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
@@ -0,0 +1,241 @@
+"""
+Durable queue for analysis jobs.
+
+The API enqueues one row per analysis and separate worker processes
+(`python -m app.worker`) claim and run them. Two backends are available,
+selected with JOB_QUEUE_BACKEND:
+
+- postgres: an `analysis_jobs` table claimed with FOR UPDATE SKIP LOCKED, so
+  any number of workers on any number of nodes can share it.
+- local: an in-process queue for development; workers run inside the API
+  process and jobs do not survive a restart.
+
+Claimed jobs hold a lease (visibility timeout). A worker that dies without
+completing its job lets the lease expire and another worker picks it up,
+until the job has used MAX_ATTEMPTS; after that it is failed (see
+`fail_expired`), so a job that crashes its worker isn't retried forever.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+from psycopg.types.json import Jsonb
+
+from app.services.database import connection
+
+MAX_ATTEMPTS = int(os.getenv("JOB_QUEUE_MAX_ATTEMPTS", "3"))
+
+EXPIRED_ERROR = "Lease expired on the final attempt; the worker likely crashed"
+
+
+class PostgresJobQueue:
+    """Job queue backed by a Postgres table."""
+
+    def ensure_schema(self):
+        """Create the jobs table if it does not exist yet."""
+        with connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS analysis_jobs (
+                        id BIGSERIAL PRIMARY KEY,
+                        payload JSONB NOT NULL,
+                        status TEXT NOT NULL DEFAULT 'queued',
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        locked_by TEXT,
+                        locked_until TIMESTAMPTZ,
+                        last_error TEXT,
+                        created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                    )
+                    """
+                )
+                cur.execute(
+                    """
+                    CREATE INDEX IF NOT EXISTS analysis_jobs_claim_idx
+                    ON analysis_jobs (status, locked_until, id)
+                    """
+                )
+
+    def enqueue(self, payload: dict) -> int:
+        """Insert a job and return its id. This is the only work done per request."""
+        with connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO analysis_jobs (payload) VALUES (%s) RETURNING id",
+                    (Jsonb(payload),)
+                )
+                job_id = cur.fetchone()[0]
+                return job_id
+
+    def claim(self, worker_id: str, visibility_timeout: float):
+        """
+        Lease the oldest available job. Returns (job_id, payload, attempts) or None.
+        Jobs whose lease expired are treated as available again while they
+        have attempts left.
+        """
+        with connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE analysis_jobs
+                    SET status = 'running',
+                        attempts = attempts + 1,
+                        locked_by = %s,
+                        locked_until = now() + make_interval(secs => %s),
+                        updated_at = now()
+                    WHERE id = (
+                        SELECT id FROM analysis_jobs
+                        WHERE status = 'queued'
+                           OR (status = 'running' AND locked_until < now() AND attempts < %s)
+                        ORDER BY id
+                        FOR UPDATE SKIP LOCKED
+                        LIMIT 1
+                    )
+                    RETURNING id, payload, attempts
+                    """,
+                    (worker_id, visibility_timeout, MAX_ATTEMPTS)
+                )
+                row = cur.fetchone()
+                return row
+
+    def fail_expired(self) -> list[dict]:
+        """
+        Fail jobs whose lease expired on their last attempt (their worker died
+        mid-run) and return their payloads.
+        """
+        with connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE analysis_jobs
+                    SET status = 'failed', last_error = %s, locked_by = NULL,
+                        locked_until = NULL, updated_at = now()
+                    WHERE status = 'running' AND locked_until < now() AND attempts >= %s
+                    RETURNING payload
+                    """,
+                    (EXPIRED_ERROR, MAX_ATTEMPTS)
+                )
+                return [row[0] for row in cur.fetchall()]
+
+    def extend(self, job_id: int, worker_id: str, visibility_timeout: float):
+        """Push the lease forward while a long job is still running."""
+        with connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE analysis_jobs
+                    SET locked_until = now() + make_interval(secs => %s)
+                    WHERE id = %s AND locked_by = %s AND status = 'running'
+                    """,
+                    (visibility_timeout, job_id, worker_id)
+                )
+
+    def complete(self, job_id: int):
+        """Mark a job as done."""
+        self._finish(job_id, "done", None)
+
+    def fail(self, job_id: int, error: str, retry: bool):
+        """Record a failure, either releasing the job for another attempt or giving up."""
+        self._finish(job_id, "queued" if retry else "failed", error)
+
+    def _finish(self, job_id: int, status: str, error):
+        with connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE analysis_jobs
+                    SET status = %s, last_error = %s, locked_by = NULL,
+                        locked_until = NULL, updated_at = now()
+                    WHERE id = %s
+                    """,
+                    (status, error, job_id)
+                )
+
+
+class LocalJobQueue:
+    """In-process job queue with the same interface, for local development."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._queued = deque()
+        self._jobs = {}  # job_id -> {"payload", "attempts", "locked_by", "locked_until"}
+
+    def ensure_schema(self):
+        pass
+
+    def enqueue(self, payload: dict) -> int:
+        with self._lock:
+            job_id = self._next_id
+            self._next_id += 1
+            self._jobs[job_id] = {"payload": payload, "attempts": 0, "locked_by": None, "locked_until": None}
+            self._queued.append(job_id)
+            return job_id
+
+    def claim(self, worker_id: str, visibility_timeout: float):
+        with self._lock:
+            now = time.monotonic()
+            # Expired leases with attempts left go back to the front of the line
+            for job_id, job in self._jobs.items():
+                if job["locked_until"] is not None and job["locked_until"] < now and job["attempts"] < MAX_ATTEMPTS:
+                    job["locked_until"] = None
+                    self._queued.appendleft(job_id)
+            if not self._queued:
+                return None
+            job_id = self._queued.popleft()
+            job = self._jobs[job_id]
+            job["attempts"] += 1
+            job["locked_by"] = worker_id
+            job["locked_until"] = now + visibility_timeout
+            return job_id, job["payload"], job["attempts"]
+
+    def fail_expired(self) -> list[dict]:
+        with self._lock:
+            now = time.monotonic()
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job["locked_until"] is not None and job["locked_until"] < now and job["attempts"] >= MAX_ATTEMPTS
+            ]
+            return [self._jobs.pop(job_id)["payload"] for job_id in expired]
+
+    def extend(self, job_id: int, worker_id: str, visibility_timeout: float):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job and job["locked_by"] == worker_id:
+                job["locked_until"] = time.monotonic() + visibility_timeout
+
+    def complete(self, job_id: int):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def fail(self, job_id: int, error: str, retry: bool):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            if retry:
+                job["locked_by"] = None
+                job["locked_until"] = None
+                self._queued.append(job_id)
+            else:
+                self._jobs.pop(job_id, None)
+
+
+_queue = None
+
+
+def get_job_queue():
+    """Return the process-wide queue for the configured backend."""
+    global _queue
+    if _queue is None:
+        backend = os.getenv("JOB_QUEUE_BACKEND", "postgres")
+        if backend == "postgres":
+            _queue = PostgresJobQueue()
+        elif backend == "local":
+            _queue = LocalJobQueue()
+        else:
+            raise ValueError(f"Unknown JOB_QUEUE_BACKEND: {backend}")
+    return _queue
@@ -0,0 +1,103 @@
+"""
+Latency, token and cost instrumentation.
+
+Every graph node and every external call is timed into Prometheus metrics,
+served at GET /metrics. The metrics cover wall time, time spent queued at
+the rate limiter, retries, and the prompt/completion tokens and estimated
+cost reported in OpenAI's `usage`. When OpenTelemetry is installed, nodes
+and external calls are also recorded as spans; they go nowhere until an
+SDK and exporter are configured (e.g. with `opentelemetry-instrument`).
+"""
+
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+import time
+
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 45, 90, 180)
+
+# USD per million (prompt, completion) tokens, for the cost estimate
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+node_seconds = Histogram(
+    "analysis_node_seconds", "Wall time of an analysis graph node", ["node", "outcome"], buckets=LATENCY_BUCKETS
+)
+external_call_seconds = Histogram(
+    "external_call_seconds", "Wall time of one external call attempt", ["service", "outcome"], buckets=LATENCY_BUCKETS
+)
+external_call_retries = Counter("external_call_retries_total", "External call attempts that were retried", ["service"])
+rate_limit_wait_seconds = Histogram(
+    "rate_limit_wait_seconds", "Time a call waited for rate limit budget and a concurrency slot", ["limiter"],
+    buckets=LATENCY_BUCKETS
+)
+llm_tokens = Counter("llm_tokens_total", "Tokens reported by OpenAI usage", ["model", "kind"])
+llm_cost = Counter("llm_cost_usd_total", "Estimated OpenAI spend in USD", ["model"])
+analyses_admitted = Counter(
+    "analyses_admitted_total", "Analysis requests by admission outcome (running, queued, queue_full, user_limit)",
+    ["outcome"]
+)
+analyses_in_flight = Gauge("analyses_in_flight", "Admitted analyses running or waiting for a slot", ["state"])
+
+_tracer = trace.get_tracer("jobmaxx") if trace is not None else None
+
+
+def span(name: str, **attributes):
+    """An OpenTelemetry span when tracing is available, otherwise a no-op."""
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels):
+    """Observe the enclosed block's duration, labelled with its outcome."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        histogram.labels(outcome=outcome, **labels).observe(time.perf_counter() - started)
+
+
+def instrument_node(name: str, node):
+    """Wrap a graph node so each run is timed and traced."""
+    @wraps(node)
+    async def wrapper(state):
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            with span(f"node.{name}"):
+                result = await node(state)
+            # Nodes usually report failures through `error` instead of raising
+            outcome = "failed" if result and result.get("error") else "ok"
+            return result
+        finally:
+            node_seconds.labels(node=name, outcome=outcome).observe(time.perf_counter() - started)
+    return wrapper
+
+
+def record_llm_usage(model: str, usage):
+    """Count prompt/completion tokens and estimated cost from a response's `usage`."""
+    if usage is None:
+        return
+    llm_tokens.labels(model=model, kind="prompt").inc(usage.prompt_tokens or 0)
+    llm_tokens.labels(model=model, kind="completion").inc(usage.completion_tokens or 0)
+    prices = MODEL_PRICES.get(model)
+    if prices:
+        cost = ((usage.prompt_tokens or 0) * prices[0] + (usage.completion_tokens or 0) * prices[1]) / 1_000_000
+        llm_cost.labels(model=model).inc(cost)
+
+
+def render():
+    """Current metrics in the Prometheus text format, with its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -1,45 +1,254 @@
-from openai import OpenAI
+from typing import Optional
+import asyncio
 import os
 import json
+import time
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from app.services.cache import Cache, hash_key
+from app.services.prompts import build_posting_text, count_tokens, PROMPT_BUILDER_VERSION, POSTING_TOKEN_BUDGET
+from app.services.rate_limit import get_limiter
+from app.services.resilience import resilient_call
+from app.services.metrics import record_llm_usage
+
+# "concurrent" writes each outreach email in its own call, at most
+# EMAIL_CONCURRENCY at a time; "single" writes all of them in one call.
+EMAIL_GENERATION_MODE = os.getenv("EMAIL_GENERATION_MODE", "concurrent")
+EMAIL_CONCURRENCY = int(os.getenv("EMAIL_CONCURRENCY", "3"))
+
+# "on" streams resume suggestions and outreach emails into their messages as
+# they are generated; partial results are pushed at most every
+# STREAM_UPDATE_INTERVAL seconds.
+LLM_STREAMING = os.getenv("LLM_STREAMING", "off")
+
+# "separate" sends the ATS review, gap analysis and resume suggestions as
+# their own calls; "combined" gets all three from one structured-output call.
+ANALYSIS_LLM_MODE = os.getenv("ANALYSIS_LLM_MODE", "separate")
+STREAM_UPDATE_INTERVAL = float(os.getenv("STREAM_UPDATE_INTERVAL", "0.5"))
+
+# A single async client shares one keep-alive connection pool across every
+# in-flight analysis in the process. It is built on first use (see
+# `get_client`), so importing this module stays cheap.
+client = None
+
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "45"))
+
+# Completion size assumed when reserving tokens-per-minute budget; corrected
+# from the response's usage once the call returns.
+COMPLETION_TOKEN_ESTIMATE = 400
+
+def get_client():
+    """The process-wide AsyncOpenAI client, created on first call."""
+    global client
+    if client is None:
+        from openai import AsyncOpenAI
+
+        # Retries are handled by resilient_call, so the SDK's own are disabled
+        client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+    return client
+
+async def aclose():
+    """Close the client's pooled connections, if it was ever created."""
+    global client
+    if client is not None:
+        await client.close()
+        client = None
+
+async def _chat(**kwargs):
+    """
+    Create a chat completion under the shared rate limiter for its model,
+    with a timeout, retries and optional hedging (see resilience.py).
+    """
+    model = kwargs["model"]
+    estimated = sum(count_tokens(m["content"], model) for m in kwargs["messages"]) + COMPLETION_TOKEN_ESTIMATE
+    limiter = get_limiter("openai", model)
+    
+    async def attempt():
+        response = await get_client().chat.completions.create(**kwargs)
+        if response.usage:
+            await limiter.record_usage(estimated, response.usage.total_tokens)
+            record_llm_usage(model, response.usage)
+        return response
+    
+    return await resilient_call("openai", attempt, OPENAI_TIMEOUT, limit=lambda: limiter.limit(estimated))
+
+async def _chat_stream(on_content, **kwargs) -> str:
+    """
+    Like `_chat`, but streams the completion and awaits `on_content(text)`
+    with the text so far, at most every STREAM_UPDATE_INTERVAL seconds.
+    Returns the full completion text.
+    """
+    model = kwargs["model"]
+    estimated = sum(count_tokens(m["content"], model) for m in kwargs["messages"]) + COMPLETION_TOKEN_ESTIMATE
+    limiter = get_limiter("openai", model)
+    
+    async def attempt():
+        parts = []
+        usage = None
+        last_update = 0.0
+        stream = await get_client().chat.completions.create(
+            stream=True, stream_options={"include_usage": True}, **kwargs
+        )
+        async for chunk in stream:
+            if chunk.usage:
+                usage = chunk.usage
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            parts.append(chunk.choices[0].delta.content)
+            if time.monotonic() - last_update >= STREAM_UPDATE_INTERVAL:
+                last_update = time.monotonic()
+                await on_content("".join(parts))
+        if usage:
+            await limiter.record_usage(estimated, usage.total_tokens)
+            record_llm_usage(model, usage)
+        return "".join(parts)
+    
+    # Separate name so hedging never runs two streams into one message
+    return await resilient_call("openai_stream", attempt, OPENAI_TIMEOUT, limit=lambda: limiter.limit(estimated))
+
+def parse_partial_json(text: str):
+    """
+    Best-effort parse of a JSON document cut off mid-stream: open strings and
+    containers are closed, and if that isn't enough, the trailing incomplete
+    member is dropped. Returns None when nothing parses yet.
+    """
+    closers = []
+    cuts = []  # (position, closers needed there) for each comma outside strings
+    in_string = escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            closers.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if closers:
+                closers.pop()
+        elif ch == ",":
+            cuts.append((i, list(closers)))
+    
+    candidate = text[:-1] if escaped else text
+    if in_string:
+        candidate += '"'
+    attempts = [candidate + "".join(reversed(closers))]
+    attempts += [text[:i] + "".join(reversed(c)) for i, c in reversed(cuts[-3:])]
+    for attempt in attempts:
+        try:
+            return json.loads(attempt)
+        except ValueError:
+            continue
+    return None
+
+EXTRACTION_MODEL = "gpt-4o-mini"
+EXTRACTION_PROMPT = """Extract job information from the text. Return JSON with:
+                - company: company name
+                - role: job title
+                - location: job location
+                - requirements: list of key requirements
+                - keywords: list of important skills/technologies mentioned"""
+
+# Extractions keyed by posting content + prompt + model. Editing the prompt or
+# model changes every key, so stale extractions are never served; bump
+# EXTRACTION_CACHE_VERSION to invalidate for any other reason (e.g. a parser change).
+EXTRACTION_CACHE_VERSION = "1"
+extraction_cache = Cache(
+    "job_info",
+    ttl=float(os.getenv("EXTRACTION_CACHE_TTL", str(7 * 86400))),
+    maxsize=int(os.getenv("EXTRACTION_CACHE_MAXSIZE", "1024"))
+)
+
+def _extraction_key(job_text: str) -> str:
+    posting = " ".join(job_text.split()).lower()
+    return hash_key(
+        EXTRACTION_CACHE_VERSION, PROMPT_BUILDER_VERSION, str(POSTING_TOKEN_BUDGET),
+        EXTRACTION_MODEL, EXTRACTION_PROMPT, posting
+    )
 
 async def extract_job_info(job_text: str) -> dict:
     """
     Extract structured job information from raw text.
+    Memoized by a hash of the normalized posting text, so the same posting
+    is only sent to the model once.
     """
-    response = client.chat.completions.create(
+    async def fetch():
+        response = await _chat(
+            model=EXTRACTION_MODEL,
+            messages=[
+                {"role": "system", "content": EXTRACTION_PROMPT},
+                # Boilerplate stripped and fitted to the posting token budget
+                {"role": "user", "content": build_posting_text(job_text, model=EXTRACTION_MODEL)}
+            ],
+            response_format={"type": "json_object"}
+        )
+        
+        try:
+            return json.loads(response.choices[0].message.content)
+        except (ValueError, TypeError):
+            return None
+    
+    job_info = await extraction_cache.get_or_fetch(
+        _extraction_key(job_text),
+        fetch,
+        should_cache=lambda result: result is not None
+    )
+    return job_info or {"company": "Unknown", "role": "Unknown", "requirements": [], "keywords": []}
+
+async def invalidate_job_info(job_text: str):
+    """Drop the cached extraction for a posting."""
+    await extraction_cache.delete(_extraction_key(job_text))
+
+async def calculate_ats_score(resume_text: str, job_keywords: list[str], job_requirements: list[str]) -> Optional[dict]:
+    """
+    Calculate ATS match score and identify matched keywords with the LLM.
+    Only used when ATS_SCORING_MODE=llm; see app/services/ats_scorer.py.
+    Returns None if the response can't be parsed.
+    """
+    response = await _chat(
         model="gpt-4o-mini",
         messages=[
             {
                 "role": "system",
-                "content": """Extract job information from the text. Return JSON with:
-                - company: company name
-                - role: job title
-                - location: job location
-                - requirements: list of key requirements
-                - keywords: list of important skills/technologies mentioned"""
+                "content": """Analyze resume against job requirements. Return JSON with:
+                - score: integer 0-100 representing match percentage
+                - matchedKeywords: list of keywords found in resume
+                - missingKeywords: list of important keywords not in resume
+                - analysis: brief explanation of the score"""
             },
-            {"role": "user", "content": job_text[:8000]}  # Limit text length
+            {
+                "role": "user",
+                "content": f"""Resume:\n{resume_text or 'No resume provided'}
+
+Job Keywords: {', '.join(job_keywords)}
+Job Requirements: {', '.join(job_requirements)}"""
+            }
         ],
         response_format={"type": "json_object"}
     )
     
     try:
         return json.loads(response.choices[0].message.content)
-    except:
-        return {"company": "Unknown", "role": "Unknown", "requirements": [], "keywords": []}
+    except (ValueError, TypeError):
+        # The caller falls back to the local scorer rather than a made-up score
+        return None
 
-async def calculate_ats_score(resume_text: str, job_keywords: list[str], job_requirements: list[str]) -> dict:
+async def refine_ats_score(resume_text: str, job_requirements: list[str], local_result: dict) -> dict:
     """
-    Calculate ATS match score and identify matched keywords.
+    Adjust a locally computed ATS result with one LLM pass (ATS_SCORING_MODE=refine).
+    Falls back to the local result if the response can't be used.
     """
-    response = client.chat.completions.create(
+    response = await _chat(
         model="gpt-4o-mini",
         messages=[
             {
                 "role": "system",
-                "content": """Analyze resume against job requirements. Return JSON with:
+                "content": """A keyword matcher produced an ATS result for this resume. Review it: move keywords
+                the resume clearly demonstrates under another name into matchedKeywords, adjust the score by at
+                most 15 points if warranted, and write the analysis. Return JSON with:
                 - score: integer 0-100 representing match percentage
                 - matchedKeywords: list of keywords found in resume
                 - missingKeywords: list of important keywords not in resume
@@ -47,9 +256,9 @@ async def calculate_ats_score(resume_text: str, job_keywords: list[str], job_req
             },
             {
                 "role": "user",
-                "content": f"""Resume:\n{resume_text[:4000] if resume_text else 'No resume provided'}
+                "content": f"""Resume:\n{resume_text}
 
-Job Keywords: {', '.join(job_keywords)}
+Keyword matcher result: {json.dumps(local_result)}
 Job Requirements: {', '.join(job_requirements)}"""
             }
         ],
@@ -57,15 +266,21 @@ Job Requirements: {', '.join(job_requirements)}"""
     )
     
     try:
-        return json.loads(response.choices[0].message.content)
-    except:
-        return {"score": 50, "matchedKeywords": [], "missingKeywords": job_keywords, "analysis": "Unable to analyze"}
+        result = json.loads(response.choices[0].message.content)
+        return {
+            "score": max(0, min(100, int(result["score"]))),
+            "matchedKeywords": list(result.get("matchedKeywords", local_result["matchedKeywords"])),
+            "missingKeywords": list(result.get("missingKeywords", local_result["missingKeywords"])),
+            "analysis": result.get("analysis") or local_result["analysis"]
+        }
+    except (KeyError, TypeError, ValueError):
+        return local_result
 
 async def analyze_gaps(resume_text: str, job_requirements: list[str], user_profile: dict) -> list[str]:
     """
     Identify gaps between candidate profile and job requirements.
     """
-    response = client.chat.completions.create(
+    response = await _chat(
         model="gpt-4o-mini",
         messages=[
             {
@@ -74,7 +289,7 @@ async def analyze_gaps(resume_text: str, job_requirements: list[str], user_profi
             },
             {
                 "role": "user",
-                "content": f"""Resume: {resume_text[:3000] if resume_text else 'Not provided'}
+                "content": f"""Resume: {resume_text or 'Not provided'}
 
 User Profile:
 - School: {user_profile.get('school', 'Not specified')}
@@ -92,16 +307,32 @@ List the gaps as a JSON array of strings."""
     try:
         result = json.loads(response.choices[0].message.content)
         return result.get("gaps", [])
-    except:
-        return ["Unable to analyze gaps"]
+    except (ValueError, TypeError, AttributeError):
+        return []
 
-async def generate_resume_suggestions(resume_text: str, job_info: dict) -> list[dict]:
+async def _complete(messages: list[dict], on_content=None) -> str:
+    """JSON-mode completion text, streamed through `on_content` when LLM_STREAMING is on."""
+    kwargs = {"model": "gpt-4o-mini", "messages": messages, "response_format": {"type": "json_object"}}
+    if on_content is not None and LLM_STREAMING == "on":
+        return await _chat_stream(on_content, **kwargs)
+    response = await _chat(**kwargs)
+    return response.choices[0].message.content
+
+async def generate_resume_suggestions(resume_text: str, job_info: dict, on_partial=None) -> list[dict]:
     """
     Generate resume bullet point improvements.
+    With streaming on, `on_partial(suggestions)` is awaited with the
+    suggestions parsed so far while the completion is still arriving.
     """
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
+    async def on_content(text: str):
+        partial = parse_partial_json(text)
+        suggestions = partial.get("suggestions") if isinstance(partial, dict) else None
+        suggestions = [s for s in suggestions or [] if isinstance(s, dict) and s.get("improved")]
+        if suggestions:
+            await on_partial(suggestions)
+    
+    content = await _complete(
+        [
             {
                 "role": "system",
                 "content": """Suggest resume improvements tailored to the job. Return JSON with:
@@ -110,31 +341,152 @@ async def generate_resume_suggestions(resume_text: str, job_info: dict) -> list[
             },
             {
                 "role": "user",
-                "content": f"""Resume: {resume_text[:3000] if resume_text else 'No resume provided - suggest general bullets'}
+                "content": f"""Resume: {resume_text or 'No resume provided - suggest general bullets'}
 
 Job: {job_info.get('role', 'Unknown')} at {job_info.get('company', 'Unknown')}
 Key Requirements: {', '.join(job_info.get('requirements', [])[:5])}
 Important Keywords: {', '.join(job_info.get('keywords', [])[:10])}"""
             }
         ],
-        response_format={"type": "json_object"}
+        on_content if on_partial else None
     )
     
     try:
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         return result.get("suggestions", [])
-    except:
+    except (ValueError, TypeError, AttributeError):
         return []
 
-async def generate_outreach_email(contact: dict, user_profile: dict, job_info: dict) -> dict:
+STRING_LIST = {"type": "array", "items": {"type": "string"}}
+
+FIT_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "ats": {
+            "type": "object",
+            "properties": {
+                "score": {"type": "integer"},
+                "matchedKeywords": STRING_LIST,
+                "missingKeywords": STRING_LIST,
+                "analysis": {"type": "string"}
+            },
+            "required": ["score", "matchedKeywords", "missingKeywords", "analysis"],
+            "additionalProperties": False
+        },
+        "gaps": STRING_LIST,
+        "suggestions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"original": {"type": "string"}, "improved": {"type": "string"}},
+                "required": ["original", "improved"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["ats", "gaps", "suggestions"],
+    "additionalProperties": False
+}
+
+def _valid_ats(ats) -> Optional[dict]:
+    try:
+        return {
+            "score": max(0, min(100, int(ats["score"]))),
+            "matchedKeywords": [str(k) for k in ats["matchedKeywords"]],
+            "missingKeywords": [str(k) for k in ats["missingKeywords"]],
+            "analysis": str(ats["analysis"])
+        }
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def _valid_gaps(gaps) -> Optional[list[str]]:
+    if not isinstance(gaps, list) or not gaps or not all(isinstance(g, str) for g in gaps):
+        return None
+    return gaps
+
+def _valid_suggestions(suggestions) -> Optional[list[dict]]:
+    if not isinstance(suggestions, list) or not suggestions:
+        return None
+    if not all(isinstance(s, dict) and s.get("original") and s.get("improved") for s in suggestions):
+        return None
+    return [{"original": s["original"], "improved": s["improved"]} for s in suggestions]
+
+async def analyze_fit(resume_text: str, job_info: dict, user_profile: dict, local_ats: dict) -> dict:
+    """
+    ATS review, gap analysis and resume suggestions from one structured-output
+    call (ANALYSIS_LLM_MODE=combined), so the resume and requirements are sent
+    once instead of three times. `local_ats` is the keyword matcher's result,
+    which the model reviews as in ATS_SCORING_MODE=refine.
+
+    Returns {"ats", "gaps", "suggestions"}; a section that is missing or fails
+    validation is None, so the caller can fall back for that section alone.
+    """
+    response = await _chat(
+        model="gpt-4o-mini",
+        messages=[
+            {
+                "role": "system",
+                "content": """You review a candidate's fit for a job. Return:
+                - ats: review the keyword matcher's result below. Move keywords the resume clearly demonstrates
+                  under another name into matchedKeywords, adjust the 0-100 score by at most 15 points if
+                  warranted, and write a brief analysis of the score.
+                - gaps: 3-5 specific gaps between the candidate and the job requirements. Be constructive and actionable.
+                - suggestions: 3-5 resume improvements tailored to the job, each with "original" (current bullet
+                  or area) and "improved" (suggested rewrite)."""
+            },
+            {
+                "role": "user",
+                "content": f"""Resume:\n{resume_text or 'No resume provided - suggest general bullets'}
+
+User Profile:
+- School: {user_profile.get('school', 'Not specified')}
+- Major: {user_profile.get('major', 'Not specified')}
+- Target Roles: {user_profile.get('targetRoles', [])}
+
+Job: {job_info.get('role', 'Unknown')} at {job_info.get('company', 'Unknown')}
+Job Requirements: {', '.join(job_info.get('requirements', []))}
+Important Keywords: {', '.join(job_info.get('keywords', [])[:10])}
+
+Keyword matcher result: {json.dumps(local_ats)}"""
+            }
+        ],
+        response_format={
+            "type": "json_schema",
+            "json_schema": {"name": "fit_analysis", "strict": True, "schema": FIT_ANALYSIS_SCHEMA}
+        }
+    )
+    
+    try:
+        result = json.loads(response.choices[0].message.content)
+    except (ValueError, TypeError):
+        result = None
+    if not isinstance(result, dict):
+        return {"ats": None, "gaps": None, "suggestions": None}
+    return {
+        "ats": _valid_ats(result.get("ats")),
+        "gaps": _valid_gaps(result.get("gaps")),
+        "suggestions": _valid_suggestions(result.get("suggestions"))
+    }
+
+async def generate_outreach_email(contact: dict, user_profile: dict, job_info: dict, on_partial=None) -> dict:
     """
     Generate personalized outreach email.
+    With streaming on, `on_partial(email)` is awaited with the email so far
+    once its body starts arriving.
     """
     school = user_profile.get('school', 'your school')
     
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
+    async def on_content(text: str):
+        partial = parse_partial_json(text)
+        if isinstance(partial, dict) and partial.get("body"):
+            await on_partial({
+                "to": contact.get('name', 'Unknown'),
+                "subject": partial.get("subject", "Reaching out"),
+                "body": partial["body"]
+            })
+    
+    content = await _complete(
+        [
             {
                 "role": "system",
                 "content": f"""Write a personalized, professional outreach email. The sender is a student from {school}.
@@ -154,16 +506,107 @@ Sender Profile:
 Applying for: {job_info.get('role', 'a position')}"""
             }
         ],
-        response_format={"type": "json_object"}
+        on_content if on_partial else None
     )
     
     try:
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         return {
             "to": contact.get('name', 'Unknown'),
             "subject": result.get("subject", "Reaching out"),
             "body": result.get("body", "")
         }
-    except:
+    except (ValueError, TypeError, AttributeError):
         return {"to": contact.get('name'), "subject": "Reaching out", "body": ""}
 
+
+def _sender_profile(user_profile: dict) -> str:
+    return f"""Sender Profile:
+- School: {user_profile.get('school', 'your school')}
+- Major: {user_profile.get('major', 'Not specified')}
+- Clubs: {user_profile.get('clubs', [])}"""
+
+async def _generate_emails_single_call(contacts: list[dict], user_profile: dict, job_info: dict) -> list[dict]:
+    """Write every email in one structured call; sender and job context are sent once."""
+    school = user_profile.get('school', 'your school')
+    contact_lines = "\n".join(
+        f"{i + 1}. {c.get('name', 'Unknown')} - {c.get('title', 'Unknown')} (Connection: {c.get('connection', 'None')})"
+        for i, c in enumerate(contacts)
+    )
+    
+    response = await _chat(
+        model="gpt-4o-mini",
+        messages=[
+            {
+                "role": "system",
+                "content": f"""Write one personalized, professional outreach email per contact. The sender is a student from {school}.
+                Keep each concise (under 150 words), genuine, and mention the shared connection.
+                Return JSON with: emails, an array in contact order of objects with subject, body"""
+            },
+            {
+                "role": "user",
+                "content": f"""Contacts at {job_info.get('company', 'Unknown')}:
+{contact_lines}
+
+{_sender_profile(user_profile)}
+
+Applying for: {job_info.get('role', 'a position')}"""
+            }
+        ],
+        response_format={"type": "json_object"}
+    )
+    
+    try:
+        # content is None for a refusal or filtered output
+        drafts = json.loads(response.choices[0].message.content or "{}").get("emails", [])
+    except (ValueError, AttributeError, TypeError):
+        drafts = []
+    
+    if not isinstance(drafts, list):
+        drafts = []
+    
+    emails = []
+    missing = []
+    for i, contact in enumerate(contacts):
+        draft = drafts[i] if i < len(drafts) and isinstance(drafts[i], dict) else {}
+        subject, body = draft.get("subject"), draft.get("body")
+        if not isinstance(subject, str) or not isinstance(body, str) or not body.strip():
+            missing.append(i)
+            emails.append(None)
+            continue
+        emails.append({
+            "to": contact.get('name', 'Unknown'),
+            "subject": subject or "Reaching out",
+            "body": body
+        })
+    
+    # Missing or malformed entries: write those on their own, side by side
+    rewritten = await asyncio.gather(*(
+        generate_outreach_email(contacts[i], user_profile, job_info) for i in missing
+    ))
+    for i, email in zip(missing, rewritten):
+        emails[i] = email
+    return emails
+
+async def generate_outreach_emails(contacts: list[dict], user_profile: dict, job_info: dict, on_partial=None) -> list[dict]:
+    """
+    Generate outreach emails for several contacts, in contact order.
+    Runs according to EMAIL_GENERATION_MODE instead of one call after another.
+    In "concurrent" mode with streaming on, `on_partial(index, email)` is
+    awaited as each email is written.
+    """
+    if not contacts:
+        return []
+    if EMAIL_GENERATION_MODE == "single":
+        return await _generate_emails_single_call(contacts, user_profile, job_info)
+    
+    semaphore = asyncio.Semaphore(EMAIL_CONCURRENCY)
+    
+    async def generate(index: int, contact: dict) -> dict:
+        async def on_email(email: dict):
+            await on_partial(index, email)
+        
+        async with semaphore:
+            return await generate_outreach_email(contact, user_profile, job_info, on_email if on_partial else None)
+    
+    return list(await asyncio.gather(*(generate(i, contact) for i, contact in enumerate(contacts))))
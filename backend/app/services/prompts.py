@@ -0,0 +1,206 @@
+"""
+Token-budget-aware prompt assembly.
+
+Instead of blind character slices, prompt inputs are measured with a local
+tokenizer (tiktoken when installed and loadable, a chars/4 estimate otherwise), stripped
+of boilerplate sections, and filled up to a per-prompt token budget with the
+most relevant blocks first. Selected blocks keep their original order.
+"""
+
+import os
+import re
+import time
+
+from app.services.ats_scorer import normalize_tokens, STOPWORDS
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Bump when selection rules change so cached results built from old prompts are not reused
+PROMPT_BUILDER_VERSION = "1"
+
+POSTING_TOKEN_BUDGET = int(os.getenv("PROMPT_POSTING_TOKENS", "1800"))
+RESUME_TOKEN_BUDGET = int(os.getenv("PROMPT_RESUME_TOKENS", "800"))
+
+# Posting sections that rarely carry requirements
+BOILERPLATE_HEADINGS = re.compile(
+    r"^(?:benefits|perks|perks (?:and|&) benefits|what we offer|why (?:join|work)|about us|about the company|"
+    r"who we are|our (?:values|culture|mission)|life at|equal (?:employment )?opportunity|eeo|diversity|"
+    r"accommodations?|privacy|pay transparency|compensation|salary|how to apply|additional information)\b",
+    re.IGNORECASE
+)
+BOILERPLATE_PHRASES = re.compile(
+    r"equal opportunity employer|without regard to race|reasonable accommodation|e-verify|"
+    r"protected veteran|sexual orientation|gender identity|applicant privacy|401\(k\)|"
+    r"paid time off|parental leave|health, dental|dental,? (?:and )?vision",
+    re.IGNORECASE
+)
+RELEVANT_HEADINGS = re.compile(
+    r"requirement|qualification|responsibilit|what you(?:'ll| will) (?:do|bring)|you (?:have|bring)|"
+    r"skills|about the (?:role|job|position)|the role|experience|nice to have|preferred|must have|tech stack",
+    re.IGNORECASE
+)
+
+
+# Seconds before retrying an encoding that failed to load
+ENCODING_RETRY_SECONDS = 300
+
+_encodings = {}
+_encoding_failed_at = {}
+
+
+def _encoding(model: str):
+    """
+    The tokenizer for `model`, or None when it can't be loaded. tiktoken
+    downloads encoding tables on first use, so an offline host or a broken
+    cache falls back to the chars/4 estimate instead of failing the prompt.
+    """
+    if tiktoken is None:
+        return None
+    if model in _encodings:
+        return _encodings[model]
+    failed_at = _encoding_failed_at.get(model)
+    if failed_at is not None and time.monotonic() - failed_at < ENCODING_RETRY_SECONDS:
+        return None
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        print(f"Could not load tokenizer for {model}, estimating tokens: {e}")
+        _encoding_failed_at[model] = time.monotonic()
+        return None
+    _encodings[model] = encoding
+    return encoding
+
+
+def load_tokenizer(model: str = "gpt-4o-mini") -> bool:
+    """Load `model`'s encoding ahead of time; False if it falls back to estimates."""
+    return _encoding(model) is not None
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Number of tokens `text` costs for `model`."""
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+def truncate_tokens(text: str, budget: int, model: str = "gpt-4o-mini") -> str:
+    """Cut `text` to at most `budget` tokens."""
+    if budget <= 0:
+        return ""
+    encoding = _encoding(model)
+    if encoding is None:
+        return text[: budget * 4]
+    tokens = encoding.encode(text)
+    return text if len(tokens) <= budget else encoding.decode(tokens[:budget])
+
+
+def _is_heading(line: str) -> bool:
+    line = line.strip().rstrip(":")
+    if not line or len(line) > 60 or not line[0].isalpha() or line.endswith(".") or len(line.split()) > 8:
+        return False
+    return line.isupper() or line.istitle() or line.endswith("?")
+
+
+def split_blocks(text: str) -> list[dict]:
+    """Split posting text into heading-led blocks."""
+    blocks = [{"heading": "", "lines": []}]
+    for line in (text or "").splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if _is_heading(stripped) and blocks[-1]["lines"]:
+            blocks.append({"heading": stripped.rstrip(":"), "lines": []})
+        elif _is_heading(stripped) and not blocks[-1]["heading"]:
+            blocks[-1]["heading"] = stripped.rstrip(":")
+        else:
+            blocks[-1]["lines"].append(stripped)
+    return [b for b in blocks if b["lines"] or b["heading"]]
+
+
+def _is_boilerplate(block: dict) -> bool:
+    if block["heading"] and BOILERPLATE_HEADINGS.match(block["heading"]):
+        return True
+    body = " ".join(block["lines"])
+    return bool(body) and len(BOILERPLATE_PHRASES.findall(body)) >= 2
+
+
+def _block_text(block: dict) -> str:
+    return "\n".join(([block["heading"]] if block["heading"] else []) + block["lines"])
+
+
+def fill_budget(candidates: list[tuple[float, str]], budget: int, model: str = "gpt-4o-mini") -> list[str]:
+    """
+    Pick texts by descending score until the token budget is spent, then
+    return them in their original order. The highest-scoring text that does
+    not fit whole is truncated into the remaining space.
+    """
+    order = sorted(range(len(candidates)), key=lambda i: -candidates[i][0])
+    chosen = {}
+    remaining = budget
+    for i in order:
+        if remaining <= 0:
+            break
+        text = candidates[i][1]
+        cost = count_tokens(text, model) + 1
+        if cost <= remaining:
+            chosen[i] = text
+            remaining -= cost
+        elif remaining >= 32:
+            chosen[i] = truncate_tokens(text, remaining - 1, model)
+            remaining = 0
+    return [chosen[i] for i in sorted(chosen)]
+
+
+def build_posting_text(job_text: str, budget: int = POSTING_TOKEN_BUDGET, model: str = "gpt-4o-mini") -> str:
+    """
+    Posting text for a prompt: boilerplate (benefits, EEO, about-us) dropped,
+    requirement-like sections preferred, at most `budget` tokens.
+    """
+    if count_tokens(job_text, model) <= budget:
+        blocks = [b for b in split_blocks(job_text) if not _is_boilerplate(b)]
+        return "\n\n".join(_block_text(b) for b in blocks) or job_text
+
+    candidates = []
+    for position, block in enumerate(split_blocks(job_text)):
+        if _is_boilerplate(block):
+            continue
+        score = 1.0
+        if block["heading"] and RELEVANT_HEADINGS.search(block["heading"]):
+            score += 2.0
+        # The opening block usually names the company, role and location
+        if position == 0:
+            score += 1.5
+        candidates.append((score, _block_text(block)))
+    return "\n\n".join(fill_budget(candidates, budget, model))
+
+
+def build_resume_text(resume: dict, focus: list[str] = None, budget: int = RESUME_TOKEN_BUDGET, model: str = "gpt-4o-mini") -> str:
+    """
+    Resume text for a prompt from a preprocessed resume (see resume.py).
+    When it doesn't fit the budget, bullets that mention the `focus` terms
+    (job keywords/requirements) are kept first; section titles stay attached.
+    """
+    if not resume or not resume.get("text"):
+        return ""
+    if count_tokens(resume["text"], model) <= budget:
+        return resume["text"]
+
+    focus_terms = {t for phrase in (focus or []) for t in normalize_tokens(phrase) if t not in STOPWORDS}
+    candidates = []
+    for section in resume["sections"]:
+        # Section titles are cheap and keep the kept bullets in context
+        candidates.append((float("inf"), section["title"].upper()))
+        for index, bullet in enumerate(section["bullets"]):
+            overlap = len(focus_terms & set(normalize_tokens(bullet)))
+            # Small bonus for leading bullets, which tend to be the strongest
+            candidates.append((overlap + 1.0 / (index + 1), f"- {bullet}"))
+    return "\n".join(fill_budget(candidates, budget, model))
@@ -0,0 +1,254 @@
+"""
+Rate limiting and concurrency governance for external APIs.
+
+Every OpenAI and Exa call goes through a `RateLimiter` for its provider and
+model. A limiter combines:
+
+- a requests-per-minute and a tokens-per-minute token bucket, so bursts
+  queue up at the provider ceiling instead of turning into 429s,
+- a cap on concurrent in-flight calls,
+- priority classes: waiting INTERACTIVE calls (user-facing analyses) are
+  always served before BACKGROUND ones (cache refreshes, batch work), both
+  for budget and for concurrency slots.
+
+Limits come from the environment, e.g. RATE_LIMIT_OPENAI_RPM, or per model
+RATE_LIMIT_OPENAI_GPT_4O_MINI_TPM. With RATE_LIMIT_SHARED_DIR set, bucket
+state lives in lock-protected files there, so all processes on a host share
+one budget.
+"""
+
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+import asyncio
+import fcntl
+import heapq
+import itertools
+import json
+import os
+import re
+import time
+
+from app.services.metrics import rate_limit_wait_seconds
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Priority of calls made from the current task
+current_priority = ContextVar("rate_limit_priority", default=INTERACTIVE)
+
+DEFAULT_LIMITS = {
+    # provider: (requests/min, tokens/min, max concurrent); 0 disables a limit
+    "openai": (500, 200_000, 64),
+    "exa": (300, 0, 32),
+}
+
+SHARED_DIR = os.getenv("RATE_LIMIT_SHARED_DIR")
+
+
+@contextmanager
+def priority(level: int):
+    """Run the enclosed calls at `level` (INTERACTIVE or BACKGROUND)."""
+    token = current_priority.set(level)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+def _env_limit(provider: str, model: str, name: str, default: int) -> int:
+    keys = [f"RATE_LIMIT_{provider.upper()}_{name}"]
+    if model:
+        model_key = re.sub(r"[^A-Z0-9]+", "_", model.upper()).strip("_")
+        keys.insert(0, f"RATE_LIMIT_{provider.upper()}_{model_key}_{name}")
+    for key in keys:
+        value = os.getenv(key)
+        if value is not None:
+            return int(value)
+    return default
+
+
+class _Buckets:
+    """Request and token buckets; 0 for rpm or tpm disables that bucket."""
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = float(rpm)
+        self.tokens = float(tpm)
+        self.updated = time.time()
+
+    def _refill(self):
+        now = time.time()
+        elapsed = max(0.0, now - self.updated)
+        self.updated = now
+        if self.rpm:
+            self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+
+    def take(self, tokens: int) -> float:
+        """Consume capacity and return 0, or return seconds to wait before retrying."""
+        self._refill()
+        # Never ask for more than a full bucket, or the call could never run
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        waits = []
+        if self.rpm and self.requests < 1:
+            waits.append((1 - self.requests) * 60 / self.rpm)
+        if self.tpm and self.tokens < tokens:
+            waits.append((tokens - self.tokens) * 60 / self.tpm)
+        if waits:
+            return max(waits)
+        if self.rpm:
+            self.requests -= 1
+        if self.tpm:
+            self.tokens -= tokens
+        return 0.0
+
+    def adjust(self, tokens: int):
+        self._refill()
+        if self.tpm:
+            self.tokens -= tokens
+
+
+class _LocalStore:
+    """Buckets held in this process."""
+
+    def __init__(self, name: str, rpm: int, tpm: int):
+        self.buckets = _Buckets(rpm, tpm)
+
+    async def take(self, tokens: int) -> float:
+        return self.buckets.take(tokens)
+
+    async def adjust(self, tokens: int):
+        self.buckets.adjust(tokens)
+
+
+class _SharedStore:
+    """Buckets kept in a flock-protected file shared by every process on the host."""
+
+    def __init__(self, name: str, rpm: int, tpm: int):
+        os.makedirs(SHARED_DIR, exist_ok=True)
+        self.path = os.path.join(SHARED_DIR, f"{name}.json")
+        self.rpm = rpm
+        self.tpm = tpm
+
+    def _update(self, apply):
+        with open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or "{}")
+                except ValueError:
+                    state = {}
+                buckets = _Buckets(self.rpm, self.tpm)
+                if state:
+                    buckets.requests = state["requests"]
+                    buckets.tokens = state["tokens"]
+                    buckets.updated = state["updated"]
+                result = apply(buckets)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps({"requests": buckets.requests, "tokens": buckets.tokens, "updated": buckets.updated}))
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    async def take(self, tokens: int) -> float:
+        return await asyncio.to_thread(self._update, lambda buckets: buckets.take(tokens))
+
+    async def adjust(self, tokens: int):
+        await asyncio.to_thread(self._update, lambda buckets: buckets.adjust(tokens))
+
+
+class RateLimiter:
+    """Token-bucket limiter with a concurrency cap and priority-ordered waiting."""
+
+    def __init__(self, name: str, rpm: int, tpm: int, max_concurrent: int):
+        self.name = name
+        self._store = (_SharedStore if SHARED_DIR else _LocalStore)(name, rpm, tpm)
+        self.max_concurrent = max_concurrent
+        self._in_flight = 0
+        self._waiters = []  # heap of (priority, seq)
+        self._wakeups = {}  # (priority, seq) -> asyncio.Event
+        self._seq = itertools.count()
+
+    def _wake_head(self):
+        """Let the highest-priority, longest-waiting caller check again."""
+        if self._waiters:
+            self._wakeups[self._waiters[0]].set()
+
+    async def _acquire(self, tokens: int):
+        """Wait in priority order for a concurrency slot, then for budget."""
+        level = current_priority.get()
+        ticket = (level, next(self._seq))
+        wakeup = asyncio.Event()
+        self._wakeups[ticket] = wakeup
+        heapq.heappush(self._waiters, ticket)
+        try:
+            while True:
+                # Cleared before checking, so a wake-up during the checks isn't lost
+                wakeup.clear()
+                # Only the head may take a slot or capacity; the rest sleep
+                # until they become the head
+                if self._waiters[0] != ticket:
+                    await wakeup.wait()
+                    continue
+                if self.max_concurrent and self._in_flight >= self.max_concurrent:
+                    # Budget is only taken once a slot is free, so none is spent
+                    # waiting; a finishing call wakes the head
+                    await wakeup.wait()
+                    continue
+                wait = await self._store.take(tokens)
+                if wait == 0:
+                    self._in_flight += 1
+                    return
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=min(wait, 1.0))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._waiters.remove(ticket)
+            heapq.heapify(self._waiters)
+            del self._wakeups[ticket]
+            # Whoever is first in line now takes over
+            self._wake_head()
+
+    @asynccontextmanager
+    async def limit(self, tokens: int = 0):
+        """
+        Wait for a concurrency slot and request/token budget, then run the
+        enclosed call. `tokens` is the estimated prompt + completion size.
+        """
+        started = time.perf_counter()
+        await self._acquire(tokens)
+        rate_limit_wait_seconds.labels(limiter=self.name).observe(time.perf_counter() - started)
+        try:
+            yield self
+        finally:
+            self._in_flight -= 1
+            self._wake_head()
+
+    async def record_usage(self, estimated: int, actual: int):
+        """Correct the token bucket once the real usage of a call is known."""
+        if actual and actual != estimated:
+            await self._store.adjust(actual - estimated)
+
+
+_limiters = {}
+
+
+def get_limiter(provider: str, model: str = "") -> RateLimiter:
+    """Return the process-wide limiter for a provider (and model)."""
+    key = f"{provider}:{model}" if model else provider
+    limiter = _limiters.get(key)
+    if limiter is None:
+        rpm, tpm, concurrency = DEFAULT_LIMITS.get(provider, (0, 0, 0))
+        limiter = RateLimiter(
+            re.sub(r"[^a-z0-9]+", "_", key.lower()),
+            _env_limit(provider, model, "RPM", rpm),
+            _env_limit(provider, model, "TPM", tpm),
+            _env_limit(provider, model, "CONCURRENCY", concurrency)
+        )
+        _limiters[key] = limiter
+    return limiter
@@ -0,0 +1,181 @@
+"""
+Deadlines, retries and hedging for external calls.
+
+`resilient_call` wraps one OpenAI or Exa request:
+
+- every attempt gets a timeout, clamped to whatever is left of the
+  surrounding analysis deadline (see `analysis_deadline`),
+- retryable failures (timeouts, connection errors, 429 and 5xx) are retried
+  with jittered exponential backoff, honouring Retry-After when present,
+- optionally, a second identical request is fired once the first has run
+  longer than the recent p95 latency for that call, and whichever finishes
+  first wins. Enable per call name with HEDGE_CALLS=exa,openai.
+
+With `limit` (a rate limiter's `limit`, see rate_limit.py), each request
+first waits for its budget and slot, and only then is timed: time spent
+queued at the limiter counts neither against the timeout nor towards the
+p95 used for hedging.
+"""
+
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+import asyncio
+import os
+import random
+import time
+
+import httpx
+
+from app.services import metrics
+
+RETRY_ATTEMPTS = int(os.getenv("EXTERNAL_CALL_RETRIES", "3"))
+RETRY_BASE_DELAY = float(os.getenv("EXTERNAL_CALL_RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("EXTERNAL_CALL_RETRY_MAX_DELAY", "8"))
+HEDGE_CALLS = {name.strip() for name in os.getenv("HEDGE_CALLS", "").split(",") if name.strip()}
+
+# Hedging only kicks in once enough latencies have been seen to estimate p95
+HEDGE_MIN_SAMPLES = 20
+_latencies = defaultdict(lambda: deque(maxlen=200))
+
+# Monotonic time by which the current analysis must finish, if any
+_deadline = ContextVar("analysis_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The analysis ran out of time before this call could be made."""
+
+
+@contextmanager
+def analysis_deadline(seconds: float):
+    """Bound every external call made inside the block by one overall deadline."""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time():
+    """Seconds left before the current deadline, or None if there is none."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, httpx.TimeoutException, httpx.TransportError)):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    # Imported here so loading this module doesn't pull in the OpenAI SDK
+    import openai
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)):
+        return True
+    return False
+
+
+def _retry_after(error: Exception):
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _hedge_delay(name: str):
+    samples = _latencies[name]
+    if name not in HEDGE_CALLS or len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    return ordered[int(len(ordered) * 0.95) - 1]
+
+
+async def _limited(call, limit):
+    if limit is None:
+        return await call()
+    async with limit():
+        return await call()
+
+
+async def _attempt(name: str, call, timeout: float, limit=None):
+    """One attempt, possibly hedged by a second copy after the p95 latency."""
+    if limit is None:
+        with metrics.timed(metrics.external_call_seconds, service=name):
+            return await _timed_attempt(name, call, timeout, None)
+    remaining = remaining_time()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded(f"{name}: analysis deadline exceeded")
+    async with limit():
+        # Queueing at the limiter is in rate_limit_wait_seconds, not here
+        with metrics.timed(metrics.external_call_seconds, service=name):
+            return await _timed_attempt(name, call, timeout, limit)
+
+
+async def _timed_attempt(name: str, call, timeout: float, limit):
+    # Checked again here, since waiting at the limiter may have used it up
+    remaining = remaining_time()
+    if remaining is not None:
+        if remaining <= 0:
+            raise DeadlineExceeded(f"{name}: analysis deadline exceeded")
+        timeout = min(timeout, remaining)
+
+    started = time.monotonic()
+    hedge_delay = _hedge_delay(name)
+    if hedge_delay is None or hedge_delay >= timeout:
+        result = await asyncio.wait_for(call(), timeout)
+        _latencies[name].append(time.monotonic() - started)
+        return result
+
+    first = asyncio.ensure_future(call())
+    done, _ = await asyncio.wait({first}, timeout=hedge_delay)
+    tasks = {first}
+    if not done:
+        # The hedge is a request of its own, so it waits for its own limiter slot
+        tasks.add(asyncio.ensure_future(_limited(call, limit)))
+    try:
+        pending = tasks
+        deadline = started + timeout
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(0.0, deadline - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                raise asyncio.TimeoutError()
+            for task in done:
+                if task.exception() is None:
+                    _latencies[name].append(time.monotonic() - started)
+                    return task.result()
+        # Every copy failed; surface the first one's error
+        return first.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def resilient_call(name: str, call, timeout: float, retries: int = RETRY_ATTEMPTS, limit=None):
+    """
+    Run `call()` (a coroutine factory) with a per-attempt timeout, retries on
+    retryable errors and optional hedging. `limit()`, if given, is entered
+    around every request before its timeout starts. Non-retryable errors
+    and the last failure are re-raised.
+    """
+    for attempt in range(retries + 1):
+        try:
+            with metrics.span(f"call.{name}", attempt=attempt):
+                return await _attempt(name, call, timeout, limit)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            delay = _retry_after(e)
+            if delay is None:
+                # Full jitter keeps retries from many analyses from lining up
+                delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+            remaining = remaining_time()
+            if remaining is not None and delay >= remaining:
+                raise
+            print(f"{name} call failed ({e!r}), retrying in {delay:.1f}s")
+            metrics.external_call_retries.labels(service=name).inc()
+            await asyncio.sleep(delay)
@@ -0,0 +1,114 @@
+"""
+Resume preprocessing.
+
+A resume is normalized and split into sections and bullets once per
+version (keyed by content hash), and every scoring and prompt-building path
+reuses the result instead of re-reading and re-slicing the raw text.
+"""
+
+import os
+import re
+import unicodedata
+
+from app.services.ats_scorer import normalize_tokens
+from app.services.cache import Cache, hash_key
+
+# Bump when the output shape or parsing rules change
+RESUME_FORMAT_VERSION = "2"
+
+# Target size of embedding-ready chunks, in characters
+CHUNK_CHARS = 600
+
+SECTION_HEADINGS = {
+    "summary", "profile", "objective", "about", "education", "experience", "work experience",
+    "professional experience", "employment", "relevant experience", "projects", "personal projects",
+    "skills", "technical skills", "skills & interests", "skills and interests", "leadership",
+    "activities", "leadership & activities", "extracurricular activities", "awards", "honors",
+    "honors & awards", "certifications", "publications", "research", "research experience",
+    "volunteer", "volunteering", "coursework", "relevant coursework", "interests", "languages",
+}
+
+BULLET_PATTERN = re.compile(r"^\s*(?:[-*•·▪◦●‣–]|\d+[.)])\s+")
+
+resume_cache = Cache(
+    "resume",
+    ttl=float(os.getenv("RESUME_CACHE_TTL", "86400")),
+    maxsize=int(os.getenv("RESUME_CACHE_MAXSIZE", "1024")),
+    persistent=False
+)
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalize and tidy whitespace while keeping line structure."""
+    text = unicodedata.normalize("NFKC", text).replace("\r\n", "\n").replace("\r", "\n")
+    lines = [re.sub(r"[ \t]+", " ", line).strip() for line in text.split("\n")]
+    text = "\n".join(lines)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def _is_heading(line: str) -> bool:
+    bare = line.rstrip(":").strip().lower()
+    if bare in SECTION_HEADINGS:
+        return True
+    # Short all-caps lines ("EXPERIENCE", "TECHNICAL SKILLS") are headings too
+    return len(line) <= 40 and line.isupper() and any(c.isalpha() for c in line)
+
+
+def split_sections(text: str) -> list[dict]:
+    """Split normalized resume text into titled sections of bullet lines."""
+    sections = [{"title": "Header", "bullets": []}]
+    for line in text.split("\n"):
+        if not line:
+            continue
+        if _is_heading(line):
+            sections.append({"title": line.rstrip(":").strip().title(), "bullets": []})
+            continue
+        bullet = BULLET_PATTERN.sub("", line)
+        current = sections[-1]["bullets"]
+        # Wrapped lines continue the previous bullet
+        if current and not BULLET_PATTERN.match(line) and line[0].islower():
+            current[-1] = f"{current[-1]} {bullet}"
+        else:
+            current.append(bullet)
+    return [s for s in sections if s["bullets"]]
+
+
+def chunk_sections(sections: list[dict], max_chars: int = CHUNK_CHARS) -> list[str]:
+    """Group bullets into section-prefixed chunks of at most ~max_chars."""
+    chunks = []
+    for section in sections:
+        current = []
+        size = 0
+        for bullet in section["bullets"]:
+            if current and size + len(bullet) > max_chars:
+                chunks.append(f"{section['title']}: " + " ".join(current))
+                current, size = [], 0
+            current.append(bullet)
+            size += len(bullet) + 1
+        if current:
+            chunks.append(f"{section['title']}: " + " ".join(current))
+    return chunks
+
+
+def preprocess_resume(resume_text: str) -> dict:
+    """Build the reusable representation of a resume. Pure and deterministic."""
+    text = normalize_text(resume_text or "")
+    sections = split_sections(text)
+    return {
+        "hash": hash_key(RESUME_FORMAT_VERSION, text),
+        "text": text,
+        "sections": sections,
+        "tokens": normalize_tokens(text),
+        "chunks": chunk_sections(sections),
+    }
+
+
+async def prepare_resume(resume_text: str) -> dict:
+    """Return the preprocessed resume, computing it once per resume version."""
+    key = hash_key(RESUME_FORMAT_VERSION, resume_text or "")
+
+    async def build():
+        return preprocess_resume(resume_text)
+
+    return await resume_cache.get_or_fetch(key, build)
+
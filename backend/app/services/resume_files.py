@@ -0,0 +1,213 @@
+"""
+Resume file ingestion.
+
+Uploaded PDF and DOCX resumes are parsed in a process pool, so large or
+many uploads don't hold the event loop (or the GIL) of an API worker.
+Parsing is bounded: files over MAX_RESUME_BYTES are rejected up front, PDF
+pages are extracted one at a time and extraction stops at MAX_RESUME_PAGES
+or MAX_RESUME_CHARS, and each pool process runs under an address-space
+limit so a pathological file fails on its own instead of taking the host
+down with it.
+
+Extracted text is cached by file hash, so re-uploading the same resume
+returns immediately. The result is the `resumeText` of a UserProfile.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import hashlib
+import io
+import os
+import zipfile
+
+from app.services.cache import Cache, hash_key
+from app.services.resume import normalize_text
+
+MAX_RESUME_BYTES = int(os.getenv("MAX_RESUME_BYTES", str(5 * 1024 * 1024)))
+MAX_RESUME_PAGES = int(os.getenv("MAX_RESUME_PAGES", "10"))
+MAX_RESUME_CHARS = int(os.getenv("MAX_RESUME_CHARS", "50000"))
+
+# DOCX files are zip archives; refuse ones that inflate past this
+MAX_DOCX_UNCOMPRESSED_BYTES = 50 * 1024 * 1024
+
+RESUME_PARSE_WORKERS = int(os.getenv("RESUME_PARSE_WORKERS", "2"))
+RESUME_PARSE_TIMEOUT = float(os.getenv("RESUME_PARSE_TIMEOUT", "30"))
+
+# Address-space limit per parser process, in MB (0 disables it)
+RESUME_PARSE_MEMORY_MB = int(os.getenv("RESUME_PARSE_MEMORY_MB", "512"))
+
+# Bump when extraction rules change so cached text is re-extracted
+EXTRACTION_VERSION = "1"
+
+extracted_text = Cache(
+    "resume_files",
+    ttl=float(os.getenv("RESUME_FILE_CACHE_TTL", str(30 * 86400))),
+    maxsize=int(os.getenv("RESUME_FILE_CACHE_MAXSIZE", "256"))
+)
+
+_pool = None
+
+
+def _limit_memory(megabytes: int):
+    """Pool initializer: cap this process's address space."""
+    if not megabytes:
+        return
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows; parsing still runs, just unbounded
+        return
+    limit = megabytes * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=RESUME_PARSE_WORKERS,
+            initializer=_limit_memory,
+            initargs=(RESUME_PARSE_MEMORY_MB,)
+        )
+    return _pool
+
+
+def _reset_pool(pool: ProcessPoolExecutor):
+    """
+    Drop a pool whose processes died (e.g. killed for exceeding memory) or
+    are stuck on a file, killing any still running so they can't pile up.
+    """
+    global _pool
+    # Parses that failed together on one pool must not reset its replacement
+    if _pool is pool:
+        # shutdown() alone would leave a stuck parse running to completion
+        for process in list((_pool._processes or {}).values()):
+            process.terminate()
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def close():
+    """Shut down the parser processes."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+def detect_format(data: bytes, filename: str = "") -> str:
+    """"pdf" or "docx", from the file's magic bytes rather than its name."""
+    if data[:5] == b"%PDF-":
+        return "pdf"
+    if data[:4] == b"PK\x03\x04":
+        return "docx"
+    raise ValueError(f"Unsupported resume file {filename!r}; upload a PDF or DOCX")
+
+
+def _extract_pdf(data: bytes, max_pages: int, max_chars: int) -> dict:
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(io.BytesIO(data), strict=False)
+    if reader.is_encrypted and not reader.decrypt(""):
+        raise ValueError("The PDF is password protected")
+
+    # Pages are parsed lazily, so only the ones read here are ever loaded
+    parts, chars = [], 0
+    page_count = len(reader.pages)
+    truncated = page_count > max_pages
+    for page in reader.pages[:max_pages]:
+        text = page.extract_text() or ""
+        parts.append(text)
+        chars += len(text)
+        if chars >= max_chars:
+            truncated = True
+            break
+
+    return {"text": "\n\n".join(parts)[:max_chars], "pages": page_count, "truncated": truncated}
+
+
+def _extract_docx(data: bytes, max_chars: int) -> dict:
+    import docx
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        if sum(info.file_size for info in archive.infolist()) > MAX_DOCX_UNCOMPRESSED_BYTES:
+            raise ValueError("The DOCX file is too large once decompressed")
+
+    document = docx.Document(io.BytesIO(data))
+
+    # Body order, so resumes laid out in tables keep their reading order
+    lines, chars, truncated = [], 0, False
+    for block in document.element.body.iterchildren():
+        if block.tag.endswith("}p"):
+            texts = [Paragraph(block, document).text]
+        elif block.tag.endswith("}tbl"):
+            texts = [
+                " | ".join(dict.fromkeys(cell.text.strip() for cell in row.cells if cell.text.strip()))
+                for row in Table(block, document).rows
+            ]
+        else:
+            continue
+        for text in texts:
+            lines.append(text)
+            chars += len(text) + 1
+        if chars >= max_chars:
+            truncated = True
+            break
+
+    return {"text": "\n".join(lines)[:max_chars], "pages": None, "truncated": truncated}
+
+
+def extract_text(data: bytes, file_format: str, max_pages: int, max_chars: int) -> dict:
+    """Runs in a pool process: raw text plus page count and truncation flag."""
+    if file_format == "pdf":
+        return _extract_pdf(data, max_pages, max_chars)
+    return _extract_docx(data, max_chars)
+
+
+async def parse_resume_file(data: bytes, filename: str = "") -> dict:
+    """
+    Extract resume text from an uploaded PDF or DOCX.
+
+    Returns {"resumeText", "format", "pages", "truncated"}. Raises ValueError
+    for files that are too large, not a PDF/DOCX, or can't be parsed.
+    """
+    if not data:
+        raise ValueError("The resume file is empty")
+    if len(data) > MAX_RESUME_BYTES:
+        raise ValueError(f"Resume files are limited to {MAX_RESUME_BYTES // (1024 * 1024)} MB")
+
+    file_format = detect_format(data, filename)
+    key = hash_key(EXTRACTION_VERSION, str(MAX_RESUME_PAGES), str(MAX_RESUME_CHARS), hashlib.sha256(data).hexdigest())
+
+    async def parse():
+        loop = asyncio.get_running_loop()
+        pool = _get_pool()
+        try:
+            result = await asyncio.wait_for(
+                loop.run_in_executor(pool, extract_text, data, file_format, MAX_RESUME_PAGES, MAX_RESUME_CHARS),
+                RESUME_PARSE_TIMEOUT
+            )
+        except BrokenProcessPool:
+            _reset_pool(pool)
+            raise ValueError("The resume file could not be parsed within the memory limit")
+        except asyncio.TimeoutError:
+            # Kill the stuck process along with its pool
+            _reset_pool(pool)
+            raise ValueError("Parsing the resume file took too long")
+        except MemoryError:
+            raise ValueError("The resume file could not be parsed within the memory limit")
+        except ValueError:
+            raise
+        except Exception as e:
+            print(f"Error parsing {file_format} resume {filename}: {e}")
+            raise ValueError(f"Could not read the {file_format.upper()} file")
+
+        text = normalize_text(result["text"])
+        if not text:
+            raise ValueError("No text found in the resume; scanned PDFs are not supported")
+        return {"resumeText": text, "format": file_format, "pages": result["pages"], "truncated": result["truncated"]}
+
+    return await extracted_text.get_or_fetch(key, parse)
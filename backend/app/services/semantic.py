@@ -0,0 +1,191 @@
+"""
+Semantic matching of job requirements against resume bullets.
+
+Keyword matching misses that "PyTorch" covers "deep learning frameworks".
+Here requirement phrases, keywords and resume bullets are embedded once,
+with vectors kept in a persistent store shared by every user (the cache
+backend, keyed by model and normalized text), and matching is a single
+NumPy matrix product over unit vectors: cosine similarity of every
+requirement against every bullet.
+
+Used by ATS_SCORING_MODE=semantic and GAP_ANALYSIS_MODE=semantic.
+"""
+
+import asyncio
+import base64
+import os
+
+import numpy as np
+
+from app.services import openai_client
+from app.services.ats_scorer import score_resume, KEYWORD_WEIGHT
+from app.services.cache import Cache, hash_key
+from app.services.metrics import llm_tokens
+from app.services.prompts import count_tokens
+from app.services.rate_limit import get_limiter
+from app.services.resilience import resilient_call
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "256"))
+
+# Inputs per embeddings request
+EMBEDDING_BATCH = 256
+
+# Cosine similarity at or above which a keyword/requirement counts as covered
+KEYWORD_THRESHOLD = float(os.getenv("SEMANTIC_KEYWORD_THRESHOLD", "0.55"))
+REQUIREMENT_THRESHOLD = float(os.getenv("SEMANTIC_REQUIREMENT_THRESHOLD", "0.5"))
+
+# Most gaps reported in semantic mode
+MAX_GAPS = 5
+
+# Vectors are stored as base64 float32 bytes, about 1.4 KB each at 256
+# dimensions in memory and in the persistent tier, instead of about 8 KB as
+# a list of Python floats
+embedding_store = Cache(
+    "embeddings",
+    ttl=float(os.getenv("EMBEDDING_STORE_TTL", str(90 * 86400))),
+    maxsize=int(os.getenv("EMBEDDING_STORE_MAXSIZE", "20000"))
+)
+
+# Part of the key, so vectors stored in an older format are never read back
+EMBEDDING_FORMAT = "float32-b64"
+
+
+def _embedding_key(text: str) -> str:
+    return hash_key(EMBEDDING_MODEL, str(EMBEDDING_DIMENSIONS), EMBEDDING_FORMAT, " ".join(text.split()).lower())
+
+
+def _encode(vector) -> str:
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode()
+
+
+def _decode(value: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(value), dtype=np.float32)
+
+
+async def _embed_batch(texts: list[str]) -> list[list[float]]:
+    limiter = get_limiter("openai", EMBEDDING_MODEL)
+    estimated = sum(count_tokens(text) for text in texts)
+
+    async def attempt():
+        response = await openai_client.get_client().embeddings.create(
+            model=EMBEDDING_MODEL, input=texts, dimensions=EMBEDDING_DIMENSIONS
+        )
+        if response.usage:
+            await limiter.record_usage(estimated, response.usage.total_tokens)
+            llm_tokens.labels(model=EMBEDDING_MODEL, kind="prompt").inc(response.usage.prompt_tokens or 0)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    return await resilient_call("openai", attempt, openai_client.OPENAI_TIMEOUT, limit=lambda: limiter.limit(estimated))
+
+
+async def embed(texts: list[str]) -> np.ndarray:
+    """
+    Unit-length embeddings, one row per text. Vectors already in the store
+    are reused; the rest are embedded in batched requests and stored.
+    """
+    if not texts:
+        return np.zeros((0, EMBEDDING_DIMENSIONS), dtype=np.float32)
+
+    keys = [_embedding_key(text) for text in texts]
+    unique = dict(zip(keys, texts))
+    stored = await embedding_store.get_many(list(unique))
+    vectors = {key: _decode(value) for key, value in stored.items()}
+
+    missing = [(key, text) for key, text in unique.items() if key not in vectors]
+    batches = [missing[i:i + EMBEDDING_BATCH] for i in range(0, len(missing), EMBEDDING_BATCH)]
+    embedded = await asyncio.gather(*[_embed_batch([text for _, text in batch]) for batch in batches])
+    new = {key: vector for batch, result in zip(batches, embedded) for (key, _), vector in zip(batch, result)}
+    await embedding_store.set_many({key: _encode(vector) for key, vector in new.items()})
+    vectors.update(new)
+
+    matrix = np.array([vectors[key] for key in keys], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def _bullets(resume: dict) -> list[str]:
+    return [bullet for section in (resume or {}).get("sections", []) for bullet in section["bullets"]]
+
+
+def best_matches(queries: np.ndarray, bullets: np.ndarray):
+    """For each query row, the index and cosine similarity of its closest bullet."""
+    if not len(queries) or not len(bullets):
+        return np.zeros(len(queries), dtype=int), np.zeros(len(queries), dtype=np.float32)
+    similarity = queries @ bullets.T
+    best = similarity.argmax(axis=1)
+    return best, similarity[np.arange(len(queries)), best]
+
+
+async def match_requirements(resume: dict, requirements: list[str]) -> list[dict]:
+    """
+    Each requirement with its closest resume bullet, the similarity, and
+    whether that clears REQUIREMENT_THRESHOLD.
+    """
+    requirements = [r for r in requirements or [] if r and r.strip()]
+    bullets = _bullets(resume)
+    requirement_vectors, bullet_vectors = await asyncio.gather(embed(requirements), embed(bullets))
+    best, scores = best_matches(requirement_vectors, bullet_vectors)
+    return [
+        {
+            "requirement": requirement,
+            "evidence": bullets[index] if bullets else None,
+            "similarity": float(score),
+            "matched": bool(score >= REQUIREMENT_THRESHOLD),
+        }
+        for requirement, index, score in zip(requirements, best, scores)
+    ]
+
+
+async def semantic_score(resume: dict, job_keywords: list[str], job_requirements: list[str]) -> dict:
+    """
+    The local ATS result, with keywords the resume demonstrates under another
+    name moved to matched and requirement coverage measured semantically.
+    """
+    result = score_resume(resume, job_keywords, job_requirements)
+    bullets = _bullets(resume)
+    if not bullets:
+        return result
+
+    missing = result["missingKeywords"]
+    requirements = [r for r in job_requirements or [] if r and r.strip()]
+    # One lookup for keywords and requirements together, one for the bullets
+    query_vectors, bullet_vectors = await asyncio.gather(embed(missing + requirements), embed(bullets))
+    _, scores = best_matches(query_vectors, bullet_vectors)
+    keyword_scores, requirement_scores = scores[:len(missing)], scores[len(missing):]
+
+    matched = result["matchedKeywords"] + [k for k, s in zip(missing, keyword_scores) if s >= KEYWORD_THRESHOLD]
+    missing = [k for k, s in zip(missing, keyword_scores) if s < KEYWORD_THRESHOLD]
+    total = len(matched) + len(missing)
+
+    keyword_coverage = len(matched) / total if total else None
+    requirement_coverage = float(np.mean(requirement_scores >= REQUIREMENT_THRESHOLD)) if requirements else None
+    if keyword_coverage is not None and requirement_coverage is not None:
+        ratio = KEYWORD_WEIGHT * keyword_coverage + (1 - KEYWORD_WEIGHT) * requirement_coverage
+    else:
+        ratio = keyword_coverage if keyword_coverage is not None else (requirement_coverage or 0.0)
+
+    if total:
+        analysis = f"Your resume covers {len(matched)} of {total} key terms for this role, counting related experience."
+        if missing:
+            analysis += f" Consider adding evidence of: {', '.join(missing[:5])}."
+    else:
+        analysis = "The posting lists no specific keywords; the score reflects how closely your experience matches its requirements."
+
+    return {
+        "score": max(0, min(100, round(100 * ratio))),
+        "matchedKeywords": matched,
+        "missingKeywords": missing,
+        "analysis": analysis
+    }
+
+
+async def semantic_gaps(resume: dict, job_requirements: list[str]) -> list[str]:
+    """Requirements no resume bullet is close to, least covered first."""
+    matches = await match_requirements(resume, job_requirements)
+    unmatched = sorted((m for m in matches if not m["matched"]), key=lambda m: m["similarity"])
+    return [
+        f"No clear evidence of \"{m['requirement']}\" on your resume. Add a bullet that demonstrates it."
+        for m in unmatched[:MAX_GAPS]
+    ]
@@ -0,0 +1,169 @@
+"""
+Analysis worker.
+
+Claims jobs from the queue in app/services/job_queue.py and runs the
+analysis graph for each one. Run as many worker processes as needed,
+independently of the API:
+
+    python -m app.worker --concurrency 16 --visibility-timeout 300
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import uuid
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.services.job_queue import get_job_queue, MAX_ATTEMPTS
+from app.services.database import aupdate_thread, close_pools, ensure_schema
+from app.services import checkpoints
+
+# Attempts at a queue or thread update before giving up on it
+DB_RETRIES = 3
+
+# Longest pause after repeated failures to reach the queue
+MAX_ERROR_BACKOFF = 30.0
+
+
+async def _retrying(what: str, call):
+    """Await `call()`, retrying transient database errors with backoff."""
+    for attempt in range(DB_RETRIES):
+        try:
+            return await call()
+        except Exception as e:
+            if attempt == DB_RETRIES - 1:
+                raise
+            print(f"Failed to {what} ({e}), retrying")
+            await asyncio.sleep(2 ** attempt)
+
+
+async def _mark_error(thread_id: int) -> bool:
+    """Set a thread's status to error; False if that couldn't be saved."""
+    try:
+        await _retrying(f"mark thread {thread_id} as errored", lambda: aupdate_thread(thread_id, status="error"))
+        return True
+    except Exception as e:
+        print(f"Could not mark thread {thread_id} as errored: {e}")
+        return False
+
+
+async def _heartbeat(queue, job_id: int, worker_id: str, visibility_timeout: float):
+    """Keep extending the lease while the job is running."""
+    while True:
+        await asyncio.sleep(visibility_timeout / 3)
+        try:
+            await asyncio.to_thread(queue.extend, job_id, worker_id, visibility_timeout)
+        except Exception as e:
+            # The next tick tries again; a lease lasts three ticks
+            print(f"Failed to extend the lease on analysis job {job_id}: {e}")
+
+
+async def _run_job(queue, job_id: int, payload: dict, attempts: int, worker_id: str, visibility_timeout: float):
+    from app.graphs.job_analysis import run_analysis
+
+    heartbeat = asyncio.create_task(_heartbeat(queue, job_id, worker_id, visibility_timeout))
+    try:
+        try:
+            await run_analysis(**payload)
+        except Exception as e:
+            retry = attempts < MAX_ATTEMPTS
+            print(f"Analysis job {job_id} failed (attempt {attempts}): {e}")
+            # Thread first: if it can't be marked, the job is left to expire and
+            # `_fail_expired` tries again instead of the thread staying "analyzing"
+            if not retry and not await _mark_error(payload["thread_id"]):
+                return
+            await _retrying(f"fail analysis job {job_id}", lambda: asyncio.to_thread(queue.fail, job_id, str(e), retry))
+        else:
+            await _retrying(f"complete analysis job {job_id}", lambda: asyncio.to_thread(queue.complete, job_id))
+    except Exception as e:
+        # The lease expires and the job is retried, or failed once out of attempts
+        print(f"Could not record the outcome of analysis job {job_id}: {e}")
+    finally:
+        heartbeat.cancel()
+
+
+async def _fail_expired(queue, interval: float, stop: asyncio.Event):
+    """Periodically give up on jobs that crashed their worker on every attempt."""
+    while not stop.is_set():
+        try:
+            for payload in await asyncio.to_thread(queue.fail_expired):
+                print(f"Analysis job for thread {payload['thread_id']} lost its worker {MAX_ATTEMPTS} times; giving up")
+                await _mark_error(payload["thread_id"])
+        except Exception as e:
+            print(f"Failed to reap expired jobs: {e}")
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _worker_loop(queue, worker_id: str, visibility_timeout: float, poll_interval: float, stop: asyncio.Event):
+    errors = 0
+    while not stop.is_set():
+        try:
+            job = await asyncio.to_thread(queue.claim, worker_id, visibility_timeout)
+            errors = 0
+            if job is not None:
+                job_id, payload, attempts = job
+                await _run_job(queue, job_id, payload, attempts, worker_id, visibility_timeout)
+                continue
+            wait = poll_interval
+        except Exception as e:
+            # Keep the loop alive through database outages, backing off as they last
+            errors += 1
+            wait = min(MAX_ERROR_BACKOFF, poll_interval * 2 ** errors)
+            print(f"Worker {worker_id} failed to claim a job ({e}); retrying in {wait:.1f}s")
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=wait)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_workers(concurrency: int, visibility_timeout: float, poll_interval: float, stop: asyncio.Event = None):
+    """
+    Run `concurrency` claim loops until `stop` is set. Each loop holds at most
+    one job, so concurrency is the per-process cap on in-flight analyses.
+    """
+    queue = get_job_queue()
+    await asyncio.to_thread(queue.ensure_schema)
+    await asyncio.to_thread(ensure_schema)
+    stop = stop or asyncio.Event()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    await asyncio.gather(
+        _fail_expired(queue, visibility_timeout / 3, stop),
+        *[
+            _worker_loop(queue, f"{worker_id}/{i}", visibility_timeout, poll_interval, stop)
+            for i in range(concurrency)
+        ]
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run JobMaxx analysis workers")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("WORKER_CONCURRENCY", "8")))
+    parser.add_argument("--visibility-timeout", type=float, default=float(os.getenv("WORKER_VISIBILITY_TIMEOUT", "300")))
+    parser.add_argument("--poll-interval", type=float, default=float(os.getenv("WORKER_POLL_INTERVAL", "1.0")))
+    args = parser.parse_args()
+
+    async def _main():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        # Finish in-flight jobs on SIGTERM/SIGINT instead of dropping them
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        try:
+            await run_workers(args.concurrency, args.visibility_timeout, args.poll_interval, stop)
+        finally:
+            await checkpoints.close()
+            await close_pools()
+
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""
+Local stand-ins for OpenAI, Exa and Postgres.
+
+The API fakes are httpx mock transports plugged into the real clients, so
+everything above the HTTP layer (rate limiting, retries, caching, parsing)
+runs unchanged. Latency is drawn from a log-normal distribution fitted to a
+median and p95, and a configurable share of calls fail with a 5xx.
+
+`SQLiteDatabase` replaces the pooled Postgres connection behind
+app/services/database.py with an in-memory SQLite database. It runs the same
+SQL, adds a fixed latency per round trip and counts the round trips.
+"""
+
+from contextlib import asynccontextmanager
+from datetime import datetime
+import asyncio
+import json
+import math
+import random
+import sqlite3
+
+import httpx
+from openai import AsyncOpenAI
+from psycopg.types.json import Jsonb
+
+POSTING_TEXT = """Software Engineer, Platform
+{url}
+
+About the role
+You will build the services behind our data platform.
+
+Requirements
+- 2+ years of experience with Python or Go
+- Experience with PostgreSQL and distributed systems
+- Familiarity with AWS, Docker and Kubernetes
+
+Nice to have
+- Experience with Kafka or other streaming systems
+
+Benefits
+Health, dental and vision. 401(k) matching. Paid time off.
+"""
+
+# One completion that satisfies every prompt's parser; each reads its own keys
+COMPLETION = {
+    "company": "Acme",
+    "role": "Software Engineer, Platform",
+    "location": "Remote",
+    "requirements": ["2+ years of Python or Go", "PostgreSQL", "Distributed systems", "AWS, Docker, Kubernetes"],
+    "keywords": ["Python", "Go", "PostgreSQL", "AWS", "Docker", "Kubernetes", "Kafka"],
+    "score": 72,
+    "matchedKeywords": ["Python", "PostgreSQL", "Docker"],
+    "missingKeywords": ["Go", "Kubernetes", "Kafka"],
+    "analysis": "Strong backend overlap; no container orchestration experience shown.",
+    "ats": {
+        "score": 74,
+        "matchedKeywords": ["Python", "PostgreSQL", "Docker", "AWS"],
+        "missingKeywords": ["Kubernetes", "Kafka"],
+        "analysis": "Strong backend overlap; no container orchestration experience shown.",
+    },
+    "gaps": ["No Kubernetes experience", "No streaming systems experience", "Limited Go experience"],
+    "suggestions": [
+        {"original": "Built backend services", "improved": "Built Python services on PostgreSQL serving 2M requests/day"},
+        {"original": "Deployed apps", "improved": "Containerized and deployed services with Docker on AWS"},
+        {"original": "Worked on data", "improved": "Designed an event pipeline processing 50K events/minute"},
+    ],
+    "subject": "Fellow alum interested in Acme",
+    "body": "Hi, I'm a student at State University applying for the platform role and would love to hear about your work.",
+    "emails": [
+        {"subject": "Fellow alum interested in Acme", "body": "Hi, I'm a student at State University and would love to connect."}
+    ] * 3,
+}
+
+SAMPLE_PROFILE = {
+    "school": "State University",
+    "graduationYear": 2025,
+    "major": "Computer Science",
+    "resumeText": """EXPERIENCE
+Software Engineering Intern, Example Corp
+- Built backend services in Python and PostgreSQL
+- Deployed apps with Docker on AWS
+- Worked on data pipelines for analytics
+
+PROJECTS
+- Distributed key-value store in Go with Raft consensus
+
+SKILLS
+Python, Go, SQL, PostgreSQL, Docker, AWS, Git
+""",
+    "targetRoles": ["Software Engineer"],
+    "clubs": ["ACM"],
+    "activities": [],
+}
+
+
+class LatencyModel:
+    """Log-normal latency with the given median and p95, plus an error rate."""
+
+    def __init__(self, median: float, p95: float, error_rate: float = 0.0, seed: int = 0):
+        self.median = median
+        self.sigma = math.log(p95 / median) / 1.645 if p95 > median > 0 else 0.0
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        return self.rng.lognormvariate(math.log(self.median), self.sigma)
+
+    def fails(self) -> bool:
+        return self.rng.random() < self.error_rate
+
+
+class FakeOpenAI:
+    """
+    Chat completions endpoint answering every prompt with `COMPLETION`,
+    as server-sent events when the request asks for a stream.
+    """
+
+    # Characters of the completion per streamed chunk
+    STREAM_CHUNK_CHARS = 40
+
+    def __init__(self, latency: LatencyModel):
+        self.latency = latency
+        self.calls = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        await asyncio.sleep(self.latency.sample())
+        if self.latency.fails():
+            return httpx.Response(500, json={"error": {"message": "injected failure", "type": "server_error"}})
+
+        body = json.loads(request.content)
+        content = json.dumps(COMPLETION)
+        prompt_tokens = len(request.content) // 4
+        completion_tokens = len(content) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        if body.get("stream"):
+            return self._stream(body, content, usage)
+        return httpx.Response(200, json={
+            "id": f"chatcmpl-fake-{self.calls}",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+                "logprobs": None,
+            }],
+            "usage": usage,
+        })
+
+    def _stream(self, body: dict, content: str, usage: dict) -> httpx.Response:
+        """The completion as chat.completion.chunk events, then usage and [DONE]."""
+        def chunk(choices: list, usage=None) -> str:
+            return "data: " + json.dumps({
+                "id": f"chatcmpl-fake-{self.calls}",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": body["model"],
+                "choices": choices,
+                "usage": usage,
+            }) + "\n\n"
+
+        events = [chunk([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])]
+        for start in range(0, len(content), self.STREAM_CHUNK_CHARS):
+            piece = content[start:start + self.STREAM_CHUNK_CHARS]
+            events.append(chunk([{"index": 0, "delta": {"content": piece}, "finish_reason": None}]))
+        events.append(chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            events.append(chunk([], usage))
+        events.append("data: [DONE]\n\n")
+        return httpx.Response(
+            200, headers={"content-type": "text/event-stream"}, content="".join(events).encode()
+        )
+
+    def client(self) -> AsyncOpenAI:
+        return AsyncOpenAI(
+            api_key="fake",
+            base_url="http://openai.fake/v1",
+            max_retries=0,
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(self.handle))
+        )
+
+
+class FakeExa:
+    """Exa /contents and /search endpoints with canned postings and profiles."""
+
+    def __init__(self, latency: LatencyModel):
+        self.latency = latency
+        self.calls = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        await asyncio.sleep(self.latency.sample())
+        if self.latency.fails():
+            return httpx.Response(503, json={"error": "injected failure"})
+
+        body = json.loads(request.content)
+        if request.url.path == "/contents":
+            return httpx.Response(200, json={"results": [
+                {"id": url, "url": url, "title": "Software Engineer, Platform", "text": POSTING_TEXT.format(url=url)}
+                for url in body["ids"]
+            ]})
+        return httpx.Response(200, json={"results": [
+            {"url": f"https://www.linkedin.com/in/alum-{i}", "title": f"Alum {i} - Software Engineer | LinkedIn"}
+            for i in range(body.get("numResults", 5))
+        ]})
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(base_url="http://exa.fake", transport=httpx.MockTransport(self.handle))
+
+
+def _adapt(value):
+    if isinstance(value, Jsonb):
+        return json.dumps(value.obj)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class _Cursor:
+    def __init__(self, conn, as_dict: bool):
+        self.conn = conn
+        self.db = conn.db
+        self.as_dict = as_dict
+        self._results = [[]]
+        self._index = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+    async def execute(self, sql: str, params=()):
+        await self.conn.send()
+        self._results = [self.db.run(sql, params, self.as_dict)]
+        self._index = 0
+        return self
+
+    async def executemany(self, sql: str, params_seq, returning: bool = False):
+        # Pipelined by psycopg, so a single round trip
+        await self.conn.send()
+        self._results = [self.db.run(sql, params, self.as_dict) for params in params_seq] or [[]]
+        self._index = 0
+
+    async def fetchone(self):
+        await self.conn.sync()
+        rows = self._results[self._index]
+        return rows.pop(0) if rows else None
+
+    async def fetchall(self):
+        await self.conn.sync()
+        rows, self._results[self._index] = self._results[self._index], []
+        return rows
+
+    def nextset(self):
+        if self._index + 1 < len(self._results):
+            self._index += 1
+            return True
+        return None
+
+
+class _Pipeline:
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def __aenter__(self):
+        self.conn.pipelined = True
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.sync()
+        self.conn.pipelined = False
+
+    async def sync(self):
+        await self.conn.sync()
+
+
+class _Connection:
+    def __init__(self, db):
+        self.db = db
+        self.pipelined = False
+        self.pending = False
+
+    async def send(self):
+        """A statement: its own round trip, or queued until the next sync in pipeline mode."""
+        if self.pipelined:
+            self.pending = True
+        else:
+            await self.db.round_trip()
+
+    async def sync(self):
+        if self.pending:
+            self.pending = False
+            await self.db.round_trip()
+
+    def pipeline(self):
+        return _Pipeline(self)
+
+    def cursor(self, row_factory=None):
+        return _Cursor(self, row_factory is not None)
+
+    async def execute(self, sql: str, params=()):
+        return await _Cursor(self, False).execute(sql, params)
+
+
+class SQLiteDatabase:
+    """In-memory SQLite stand-in for the Postgres pool behind database.py."""
+
+    SCHEMA = """
+        CREATE TABLE threads (
+            id INTEGER PRIMARY KEY, job_url TEXT, company TEXT, role TEXT,
+            status TEXT DEFAULT 'analyzing', updated_at TEXT
+        );
+        CREATE TABLE messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, thread_id INTEGER NOT NULL, role TEXT NOT NULL,
+            content TEXT NOT NULL, message_type TEXT, metadata TEXT, created_at TEXT
+        );
+        CREATE TABLE analysis_steps (
+            thread_id INTEGER NOT NULL, step TEXT NOT NULL, created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (thread_id, step)
+        );
+    """
+
+    def __init__(self, round_trip_latency: float = 0.0):
+        self.round_trip_latency = round_trip_latency
+        self.round_trips = 0
+        # Autocommit: concurrent "connections" share this one SQLite handle
+        self.conn = sqlite3.connect(":memory:", isolation_level=None)
+        self.conn.executescript(self.SCHEMA)
+
+    async def round_trip(self):
+        self.round_trips += 1
+        if self.round_trip_latency:
+            await asyncio.sleep(self.round_trip_latency)
+
+    def run(self, sql: str, params, as_dict: bool) -> list:
+        statement = sql.strip()
+        # Tables are created up front, and events are delivered in-process
+        if statement.upper().startswith("CREATE") or "pg_notify" in statement:
+            return []
+        cur = self.conn.execute(statement.replace("%s", "?"), [_adapt(p) for p in params])
+        rows = cur.fetchall()
+        if not as_dict:
+            return rows
+        columns = [d[0] for d in cur.description or ()]
+        result = []
+        for row in rows:
+            record = dict(zip(columns, row))
+            if isinstance(record.get("metadata"), str):
+                record["metadata"] = json.loads(record["metadata"])
+            result.append(record)
+        return result
+
+    def create_thread(self, job_url: str) -> int:
+        return self.conn.execute("INSERT INTO threads (job_url) VALUES (?)", (job_url,)).lastrowid
+
+    def thread_statuses(self, thread_ids: list[int] = None) -> dict:
+        if thread_ids is None:
+            return dict(self.conn.execute("SELECT status, count(*) FROM threads GROUP BY status").fetchall())
+        placeholders = ",".join("?" * len(thread_ids))
+        return dict(self.conn.execute(
+            f"SELECT status, count(*) FROM threads WHERE id IN ({placeholders}) GROUP BY status", thread_ids
+        ).fetchall())
+
+    @asynccontextmanager
+    async def connection(self):
+        """Drop-in for database.aconnection."""
+        yield _Connection(self)
@@ -0,0 +1,90 @@
+"""
+Import-time benchmark for the API.
+
+A new replica can't serve until `app.main` is imported, so this measures
+that import in fresh interpreters and fails when it exceeds a budget:
+
+    cd backend
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --runs 10 --budget 1.5 --top 15
+
+Reports the median and worst wall time of `import app.main` and the
+modules with the largest cumulative import time (from `python -X importtime`).
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+from benchmarks.run import configure_environment
+
+MEASURE = "import time; started = time.perf_counter(); import app.main; print(time.perf_counter() - started)"
+
+# "import time:  self [us] | cumulative | imported package"
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure how long importing app.main takes")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=2.0, help="seconds allowed for the median import")
+    parser.add_argument("--top", type=int, default=10, help="slowest top-level modules to list")
+    return parser.parse_args(argv)
+
+
+def measure(env: dict, importtime: bool = False):
+    """Import app.main in a fresh interpreter; returns (seconds, -X importtime output)."""
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", MEASURE]
+    result = subprocess.run(
+        command, env=env, capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    return float(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_modules(importtime_output: str, top: int) -> list[tuple[str, float]]:
+    """Modules imported directly by app.main, by cumulative seconds."""
+    # Children are printed before their parent, so collect first-level
+    # entries until the top-level app.main line closes them
+    modules = []
+    for line in importtime_output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        depth, name = len(match.group(3)), match.group(4)
+        if depth == 0:
+            if name == "app.main":
+                break
+            modules = []
+        elif depth == 2:
+            # Only the first level of nesting, so packages aren't counted twice
+            modules.append((name, int(match.group(2)) / 1e6))
+    return sorted(modules, key=lambda m: m[1], reverse=True)[:top]
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_environment()
+    env = dict(os.environ)
+
+    # The first run also warms the OS page cache and bytecode caches
+    measure(env)
+    timings = [measure(env)[0] for _ in range(args.runs)]
+    _, breakdown = measure(env, importtime=True)
+
+    median = statistics.median(timings)
+    print(f"import app.main over {args.runs} runs: median {median:.3f}s, worst {max(timings):.3f}s")
+    print("slowest imports (cumulative):")
+    for name, seconds in slowest_modules(breakdown, args.top):
+        print(f"  {seconds:7.3f}s  {name}")
+
+    if median > args.budget:
+        print(f"OVER BUDGET: median {median:.3f}s exceeds {args.budget:.3f}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Offline benchmark for the analysis pipeline.
+
+Runs `run_analysis` (or POST /api/analyze end to end) against the local
+stand-ins in fakes.py, so throughput and latency can be measured on any
+Linux box without OpenAI, Exa or Postgres:
+
+    cd backend
+    python -m benchmarks.run --runs 200 --concurrency 20
+    python -m benchmarks.run --mode endpoint --json bench.json
+    python -m benchmarks.run --baseline bench.json --max-regression 0.15
+
+Reports p50/p95/p99 latency, analyses per second, the share of analyses
+that didn't complete, and DB round trips and external calls per analysis.
+The run fails (exit code 1) when that error rate exceeds --max-error-rate
+(0 by default), and with --baseline also when p95 latency, throughput or
+the error rate regress by more than --max-regression. Set LLM_STREAMING=on
+to benchmark the streaming code path.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+
+def _latency(value: str):
+    median, p95 = (float(v) for v in value.split(","))
+    return median, p95
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline against local fakes")
+    parser.add_argument("--mode", choices=["graph", "endpoint"], default="graph",
+                        help="graph calls run_analysis directly; endpoint goes through POST /api/analyze")
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--openai-latency", type=_latency, default=(0.8, 2.5), metavar="MEDIAN,P95")
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--exa-latency", type=_latency, default=(0.4, 1.2), metavar="MEDIAN,P95")
+    parser.add_argument("--exa-error-rate", type=float, default=0.0)
+    parser.add_argument("--db-latency", type=float, default=0.001, help="seconds per DB round trip")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="report from an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.15)
+    parser.add_argument("--max-error-rate", type=float, default=0.0,
+                        help="share of analyses allowed to end in a status other than complete")
+    return parser.parse_args(argv)
+
+
+def configure_environment():
+    """Point the app at local backends; must run before any app module is imported."""
+    for key, value in {
+        "OPENAI_API_KEY": "fake",
+        "EXA_API_KEY": "fake",
+        "CACHE_BACKEND": "none",
+        "MESSAGE_EVENTS_BACKEND": "local",
+        "ANALYSIS_CHECKPOINT_BACKEND": "none",
+        "ANALYSIS_EXECUTION_MODE": "background",
+        # Every run is a distinct analysis; measure the work, not the coalescing
+        "ANALYSIS_COALESCING": "off",
+        # Provider ceilings would dominate; measure the pipeline itself
+        "RATE_LIMIT_OPENAI_RPM": "0",
+        "RATE_LIMIT_OPENAI_TPM": "0",
+        "RATE_LIMIT_EXA_RPM": "0",
+    }.items():
+        os.environ.setdefault(key, value)
+
+
+async def benchmark(args) -> dict:
+    from benchmarks.fakes import FakeOpenAI, FakeExa, LatencyModel, SQLiteDatabase, SAMPLE_PROFILE
+    from app.services import database, exa_client, openai_client
+    from app.graphs.job_analysis import run_analysis
+
+    db = SQLiteDatabase(args.db_latency)
+    database.aconnection = db.connection
+    openai_fake = FakeOpenAI(LatencyModel(*args.openai_latency, args.openai_error_rate, args.seed))
+    exa_fake = FakeExa(LatencyModel(*args.exa_latency, args.exa_error_rate, args.seed + 1))
+    openai_client.client = openai_fake.client()
+    exa_client.http_client = exa_fake.client()
+
+    http = None
+    if args.mode == "endpoint":
+        import httpx
+        from app.main import app
+
+        # ASGITransport returns once the app call ends, which includes the
+        # background analysis, so latency covers accept + analysis
+        http = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+    async def analyze(i: int):
+        # Distinct URLs so caches don't turn runs into lookups
+        job_url = f"https://jobs.example.com/postings/{i}"
+        thread_id = db.create_thread(job_url)
+        if i >= 0:
+            thread_ids.append(thread_id)
+        if http is None:
+            await run_analysis(thread_id, job_url, SAMPLE_PROFILE)
+        else:
+            response = await http.post("/api/analyze", json={
+                # One user per run, so the per-user cap doesn't throttle the benchmark
+                "threadId": thread_id, "jobUrl": job_url, "userProfile": SAMPLE_PROFILE, "userId": f"bench-{i}"
+            })
+            response.raise_for_status()
+
+    # Measured runs only; warm-up threads don't count towards the statuses
+    thread_ids = []
+    for i in range(args.warmup):
+        await analyze(-1 - i)
+    db.round_trips = openai_fake.calls = exa_fake.calls = 0
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def timed_run(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            await analyze(i)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(timed_run(i) for i in range(args.runs)))
+    elapsed = time.perf_counter() - started
+    if http is not None:
+        await http.aclose()
+
+    statuses = db.thread_statuses(thread_ids)
+    percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "mode": args.mode,
+        "runs": args.runs,
+        "concurrency": args.concurrency,
+        "p50": percentiles[49],
+        "p95": percentiles[94],
+        "p99": percentiles[98],
+        "throughput": args.runs / elapsed,
+        "dbRoundTripsPerRun": db.round_trips / args.runs,
+        "openaiCallsPerRun": openai_fake.calls / args.runs,
+        "exaCallsPerRun": exa_fake.calls / args.runs,
+        "statuses": statuses,
+        "errorRate": 1 - statuses.get("complete", 0) / args.runs,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressions of `report` against `baseline` beyond `tolerance`."""
+    problems = []
+    if report["p95"] > baseline["p95"] * (1 + tolerance):
+        problems.append(f"p95 {report['p95']:.3f}s vs baseline {baseline['p95']:.3f}s")
+    if report["throughput"] < baseline["throughput"] * (1 - tolerance):
+        problems.append(f"throughput {report['throughput']:.2f}/s vs baseline {baseline['throughput']:.2f}/s")
+    # Reports written before the error rate was recorded count as error-free
+    baseline_errors = baseline.get("errorRate", 0.0)
+    if report["errorRate"] > baseline_errors * (1 + tolerance):
+        problems.append(f"error rate {report['errorRate']:.1%} vs baseline {baseline_errors:.1%}")
+    if report["dbRoundTripsPerRun"] > baseline["dbRoundTripsPerRun"] * (1 + tolerance):
+        problems.append(
+            f"DB round trips {report['dbRoundTripsPerRun']:.1f} vs baseline {baseline['dbRoundTripsPerRun']:.1f} per run"
+        )
+    return problems
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_environment()
+    report = asyncio.run(benchmark(args))
+
+    print(f"{report['runs']} analyses ({report['mode']}, concurrency {report['concurrency']})")
+    print(f"  latency     p50 {report['p50']:.3f}s  p95 {report['p95']:.3f}s  p99 {report['p99']:.3f}s")
+    print(f"  throughput  {report['throughput']:.2f} analyses/s")
+    print(f"  per run     {report['dbRoundTripsPerRun']:.1f} DB round trips, "
+          f"{report['openaiCallsPerRun']:.1f} OpenAI calls, {report['exaCallsPerRun']:.1f} Exa calls")
+    print(f"  statuses    {report['statuses']} ({report['errorRate']:.1%} not complete)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failed = False
+    if report["errorRate"] > args.max_error_rate:
+        print(f"FAILED: {report['errorRate']:.1%} of analyses didn't complete (allowed {args.max_error_rate:.1%})")
+        failed = True
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(report, json.load(f), args.max_regression)
+        for problem in problems:
+            print(f"REGRESSION: {problem}")
+        failed = failed or bool(problems)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+from app.services.ats_scorer import normalize_phrase, normalize_tokens, score_resume, stem
+
+
+def _resume(text: str) -> dict:
+    return {"text": text, "tokens": normalize_tokens(text)}
+
+
+def _matched(resume_text: str, keywords: list[str]) -> list[str]:
+    return score_resume(_resume(resume_text), keywords, [])["matchedKeywords"]
+
+
+def test_plurals_keep_their_stem():
+    assert stem("databases") == stem("database") == "database"
+    assert stem("services") == stem("service") == "service"
+    assert stem("classes") == "class"
+    assert stem("libraries") == "library"
+
+
+def test_short_plurals_are_stripped():
+    assert stem("apis") == "api"
+    assert stem("gpus") == "gpu"
+    assert stem("ios") == "ios"
+
+
+def test_words_ending_in_s_that_are_not_plurals():
+    assert stem("access") == "access"
+    assert stem("status") == "status"
+    assert stem("analysis") == "analysis"
+
+
+def test_rest_apis_matches_rest_api():
+    assert _matched("Designed REST APIs for billing", ["REST API"]) == ["REST API"]
+    assert _matched("Designed a REST API for billing", ["REST APIs"]) == ["REST APIs"]
+
+
+def test_plural_keywords_match_singular_resume_terms():
+    assert _matched("Tuned a Postgres database", ["Databases"]) == ["Databases"]
+    assert _matched("Built backend services", ["Service"]) == ["Service"]
+
+
+def test_synonym_expansion_is_idempotent():
+    assert normalize_phrase("Azure") == normalize_phrase("Microsoft Azure")
+    assert normalize_tokens("Microsoft Excel") == ["microsoft", "excel"]
+
+
+def test_vendor_prefixed_resume_terms_match_bare_keywords():
+    assert _matched("Deployed services on Microsoft Azure", ["Azure"]) == ["Azure"]
+    assert _matched("Built models in Microsoft Excel", ["Excel"]) == ["Excel"]
+    assert _matched("Deployed services on Azure", ["Microsoft Azure"]) == ["Microsoft Azure"]
+
+
+def test_node_only_matches_node_js():
+    assert _matched("Implemented graph node traversal", ["Node.js"]) == []
+    assert _matched("Wrote services in Node.js", ["Node.js"]) == ["Node.js"]
+    assert _matched("Wrote services in NodeJS", ["Node.js"]) == ["Node.js"]
@@ -4,6 +4,31 @@ import { db } from "@/lib/db";
 import { users } from "@/lib/db/schema";
 import { eq } from "drizzle-orm";
 
+const BACKEND_URL = process.env.BACKEND_URL || "http://localhost:8000";
+
+// Extract the uploaded resume's text on the backend, which parses PDF/DOCX
+// files off its request path
+async function parseResume(file: File): Promise<string | null> {
+  const body = new FormData();
+  body.append("file", file, file.name);
+  try {
+    const response = await fetch(`${BACKEND_URL}/api/resume/parse`, {
+      method: "POST",
+      body,
+    });
+    if (!response.ok) {
+      console.error("Error parsing resume:", await response.text());
+      return null;
+    }
+    const { resumeText } = await response.json();
+    return resumeText;
+  } catch (error) {
+    // The rest of the profile is still saved
+    console.error("Error parsing resume:", error);
+    return null;
+  }
+}
+
 export async function GET() {
   try {
     const { userId } = await auth();
@@ -40,6 +65,8 @@ export async function POST(request: NextRequest) {
     const formData = await request.formData();
     const dataString = formData.get("data") as string;
     const data = JSON.parse(dataString || "{}");
+    const resumeFile = formData.get("resume");
+    const resumeText = resumeFile instanceof File ? await parseResume(resumeFile) : null;
 
     // Check if user exists
     const [existingUser] = await db
@@ -61,6 +88,7 @@ export async function POST(request: NextRequest) {
           clubs: data.clubs ? data.clubs.split(",").map((c: string) => c.trim()) : null,
           activities: data.activities ? data.activities.split(",").map((a: string) => a.trim()) : null,
           extraInfo: data.extraInfo || null,
+          ...(resumeText ? { resumeText } : {}),
           onboardingComplete: true,
           updatedAt: new Date(),
         })
@@ -78,6 +106,7 @@ export async function POST(request: NextRequest) {
         clubs: data.clubs ? data.clubs.split(",").map((c: string) => c.trim()) : null,
         activities: data.activities ? data.activities.split(",").map((a: string) => a.trim()) : null,
         extraInfo: data.extraInfo || null,
+        resumeText,
         onboardingComplete: true,
       });
     }
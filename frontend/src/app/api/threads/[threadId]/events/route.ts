@@ -0,0 +1,72 @@
+import { NextRequest, NextResponse } from "next/server";
+import { auth } from "@clerk/nextjs/server";
+import { db } from "@/lib/db";
+import { users, threads } from "@/lib/db/schema";
+import { eq, and } from "drizzle-orm";
+
+const BACKEND_URL = process.env.BACKEND_URL || "http://localhost:8000";
+
+export const dynamic = "force-dynamic";
+
+export async function GET(
+  request: NextRequest,
+  { params }: { params: Promise<{ threadId: string }> }
+) {
+  try {
+    const { userId } = await auth();
+    if (!userId) {
+      return NextResponse.json({ error: "Unauthorized" }, { status: 401 });
+    }
+
+    const { threadId } = await params;
+    const threadIdNum = parseInt(threadId);
+
+    // Get user
+    const [user] = await db
+      .select()
+      .from(users)
+      .where(eq(users.clerkId, userId))
+      .limit(1);
+
+    if (!user) {
+      return NextResponse.json({ error: "User not found" }, { status: 404 });
+    }
+
+    // Verify ownership before opening the stream
+    const [thread] = await db
+      .select({ id: threads.id })
+      .from(threads)
+      .where(and(eq(threads.id, threadIdNum), eq(threads.userId, user.id)))
+      .limit(1);
+
+    if (!thread) {
+      return NextResponse.json({ error: "Thread not found" }, { status: 404 });
+    }
+
+    // Proxy the backend's event stream, forwarding the resume position
+    const after = request.nextUrl.searchParams.get("after") || "0";
+    const lastEventId = request.headers.get("last-event-id");
+    const upstream = await fetch(
+      `${BACKEND_URL}/api/threads/${threadIdNum}/events?after=${encodeURIComponent(after)}`,
+      {
+        headers: lastEventId ? { "Last-Event-ID": lastEventId } : {},
+        signal: request.signal,
+      }
+    );
+
+    if (!upstream.ok || !upstream.body) {
+      return NextResponse.json({ error: "Stream unavailable" }, { status: 502 });
+    }
+
+    return new Response(upstream.body, {
+      headers: {
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache, no-transform",
+        Connection: "keep-alive",
+      },
+    });
+  } catch (error) {
+    console.error("Error streaming thread:", error);
+    return NextResponse.json({ error: "Internal server error" }, { status: 500 });
+  }
+}
@@ -89,30 +89,50 @@ export async function POST(request: NextRequest) {
       messageType: "text",
     });
 
-    // Trigger backend analysis (fire and forget)
-    fetch(`${BACKEND_URL}/api/analyze`, {
-      method: "POST",
-      headers: {
-        "Content-Type": "application/json",
-      },
-      body: JSON.stringify({
-        threadId: thread.id,
-        jobUrl,
-        userProfile: {
-          school: user.school,
-          graduationYear: user.graduationYear,
-          major: user.major,
-          resumeText: user.resumeText,
-          linkedinUrl: user.linkedinUrl,
-          targetRoles: user.targetRoles,
-          clubs: user.clubs,
-          activities: user.activities,
-          extraInfo: user.extraInfo,
+    // Trigger backend analysis; it returns as soon as the analysis is
+    // admitted, or refuses at once when the backend is at capacity
+    let admission: Response | null = null;
+    try {
+      admission = await fetch(`${BACKEND_URL}/api/analyze`, {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
         },
-      }),
-    }).catch((err) => {
+        body: JSON.stringify({
+          threadId: thread.id,
+          jobUrl,
+          userId,
+          userProfile: {
+            school: user.school,
+            graduationYear: user.graduationYear,
+            major: user.major,
+            resumeText: user.resumeText,
+            linkedinUrl: user.linkedinUrl,
+            targetRoles: user.targetRoles,
+            clubs: user.clubs,
+            activities: user.activities,
+            extraInfo: user.extraInfo,
+          },
+        }),
+      });
+    } catch (err) {
       console.error("Error triggering analysis:", err);
-    });
+    }
+
+    if (admission && (admission.status === 429 || admission.status === 503)) {
+      const retryAfter = admission.headers.get("Retry-After") || "60";
+      await db.insert(messages).values({
+        threadId: thread.id,
+        role: "assistant",
+        content: `We're analyzing a lot of applications right now. Please try again in about ${retryAfter} seconds.`,
+        messageType: "text",
+      });
+      await db.update(threads).set({ status: "error" }).where(eq(threads.id, thread.id));
+      return NextResponse.json(
+        { threadId: thread.id, error: "Analysis capacity reached" },
+        { status: admission.status, headers: { "Retry-After": retryAfter } }
+      );
+    }
 
     return NextResponse.json({ threadId: thread.id });
   } catch (error) {
@@ -31,26 +31,67 @@ export default function ThreadPage() {
   const scrollRef = useRef<HTMLDivElement>(null);
 
   useEffect(() => {
+    let eventSource: EventSource | null = null;
+    let cancelled = false;
+
     const fetchThread = async () => {
+      let lastMessageId = 0;
+      let analyzing = false;
       try {
         const response = await fetch(`/api/threads/${threadId}`);
         if (response.ok) {
           const data = await response.json();
           setThread(data.thread);
           setMessages(data.messages);
+          lastMessageId = data.messages.reduce(
+            (max: number, message: Message) => Math.max(max, message.id),
+            0
+          );
+          analyzing = data.thread.status === "analyzing";
         }
       } catch (error) {
         console.error("Error fetching thread:", error);
       } finally {
         setLoading(false);
       }
+
+      if (cancelled || !analyzing) return;
+
+      // Stream new messages while analyzing; EventSource resumes from the
+      // last received message id on reconnect
+      eventSource = new EventSource(
+        `/api/threads/${threadId}/events?after=${lastMessageId}`
+      );
+      eventSource.addEventListener("message", (event) => {
+        const message = JSON.parse(event.data) as Message;
+        setMessages((prev) =>
+          prev.some((m) => m.id === message.id) ? prev : [...prev, message]
+        );
+      });
+      // Long messages (emails, resume suggestions) are rewritten as they stream in
+      eventSource.addEventListener("message_update", (event) => {
+        const message = JSON.parse(event.data) as Message;
+        setMessages((prev) =>
+          prev.some((m) => m.id === message.id)
+            ? prev.map((m) => (m.id === message.id ? message : m))
+            : [...prev, message]
+        );
+      });
+      eventSource.addEventListener("thread", (event) => {
+        const data = JSON.parse((event as MessageEvent).data) as Thread;
+        setThread((prev) => ({ ...prev, ...data }));
+        if (data.status !== "analyzing") {
+          eventSource?.close();
+        }
+      });
     };
 
     fetchThread();
 
-    // Poll for new messages while analyzing
-    const interval = setInterval(fetchThread, 2000);
-    return () => clearInterval(interval);
+    return () => {
+      cancelled = true;
+      eventSource?.close();
+    };
   }, [threadId]);
 
   useEffect(() => {